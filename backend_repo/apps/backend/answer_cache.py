@@ -0,0 +1,149 @@
+# answer_cache.py
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fingerprint TEXT NOT NULL,
+        embedding BLOB NOT NULL,
+        answer TEXT NOT NULL,
+        sources TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_fingerprint ON answers (fingerprint);
+CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used);
+CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+);
+"""
+
+def context_fingerprint(hits: list, page_url: Optional[str], page_text: Optional[str]) -> str:
+        """Hash of everything besides the question that goes into the prompt."""
+        h = hashlib.sha1()
+        keys = sorted(
+                f"{d.metadata.get('source', '')}|{d.metadata.get('ingested_at', '')}|"
+                f"{hashlib.sha1(d.page_content.encode('utf-8')).hexdigest()}"
+                for d in hits
+        )
+        for key in keys:
+                h.update(key.encode("utf-8"))
+                h.update(b"\0")
+        h.update((page_url or "").encode("utf-8"))
+        h.update(b"\0")
+        h.update((page_text or "").encode("utf-8"))
+        return h.hexdigest()
+
+def ingest_version(hits: list) -> str:
+        return max((d.metadata.get("ingested_at") or "" for d in hits), default="")
+
+class AnswerCache:
+        """
+        Semantic cache of generated answers.
+
+        An entry is served only when the retrieved context fingerprint matches
+        exactly and the cosine similarity between query embeddings is above
+        `threshold`. Entries expire after `ttl` seconds and the least recently
+        used ones are evicted beyond `maxsize`. With a file `path` the cache
+        lives in SQLite and is shared by every worker on the host.
+        """
+
+        def __init__(self, path: str = ":memory:", maxsize: int = 1000, ttl: float = 86400, threshold: float = 0.95):
+                self.path = path
+                self.maxsize = maxsize
+                self.ttl = ttl
+                self.threshold = threshold
+                self.hits = 0
+                self.misses = 0
+                self._lock = threading.Lock()
+                self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+                if path != ":memory:":
+                        self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.executescript(SCHEMA)
+                self._conn.commit()
+
+        def lookup(self, query_vec: List[float], fingerprint: str) -> Optional[Dict[str, Any]]:
+                q = np.asarray(query_vec, dtype=np.float32)
+                q_norm = float(np.linalg.norm(q)) or 1.0
+                now = time.time()
+                with self._lock:
+                        rows = self._conn.execute(
+                                "SELECT id, embedding, answer, sources FROM answers "
+                                "WHERE fingerprint = ? AND created_at >= ?",
+                                (fingerprint, now - self.ttl),
+                        ).fetchall()
+                        best = None
+                        best_sim = self.threshold
+                        for row_id, blob, answer, sources in rows:
+                                v = np.frombuffer(blob, dtype=np.float32)
+                                if v.shape != q.shape:
+                                        continue
+                                sim = float(v @ q) / ((float(np.linalg.norm(v)) or 1.0) * q_norm)
+                                if sim >= best_sim:
+                                        best, best_sim = (row_id, answer, sources), sim
+                        if best is None:
+                                self.misses += 1
+                                return None
+                        self.hits += 1
+                        self._conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (now, best[0]))
+                        self._conn.commit()
+                return {"answer": best[1], "sources": json.loads(best[2]), "similarity": round(best_sim, 4)}
+
+        def store(self, query_vec: List[float], fingerprint: str, answer: str, sources: List[str]) -> None:
+                if self.maxsize <= 0:
+                        return
+                blob = np.asarray(query_vec, dtype=np.float32).tobytes()
+                now = time.time()
+                with self._lock:
+                        self._conn.execute(
+                                "INSERT INTO answers (fingerprint, embedding, answer, sources, created_at, last_used) "
+                                "VALUES (?, ?, ?, ?, ?, ?)",
+                                (fingerprint, blob, answer, json.dumps(sources), now, now),
+                        )
+                        self._conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl,))
+                        self._conn.execute(
+                                "DELETE FROM answers WHERE id NOT IN "
+                                "(SELECT id FROM answers ORDER BY last_used DESC LIMIT ?)",
+                                (self.maxsize,),
+                        )
+                        self._conn.commit()
+
+        def sync_version(self, version: str) -> None:
+                """Drop every entry once a newer ingest timestamp shows up."""
+                if not version:
+                        return
+                with self._lock:
+                        row = self._conn.execute("SELECT value FROM meta WHERE key = 'ingested_at'").fetchone()
+                        if row is not None and row[0] >= version:
+                                return
+                        if row is not None:
+                                self._conn.execute("DELETE FROM answers")
+                        self._conn.execute(
+                                "INSERT OR REPLACE INTO meta (key, value) VALUES ('ingested_at', ?)",
+                                (version,),
+                        )
+                        self._conn.commit()
+
+        def clear(self) -> None:
+                with self._lock:
+                        self._conn.execute("DELETE FROM answers")
+                        self._conn.commit()
+
+        def stats(self) -> Dict[str, Any]:
+                with self._lock:
+                        size = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+                        return {
+                                "backend": "memory" if self.path == ":memory:" else self.path,
+                                "size": size,
+                                "maxsize": self.maxsize,
+                                "hits": self.hits,
+                                "misses": self.misses,
+                        }
@@ -1,29 +1,347 @@
 # app.py
 import os
 import re
+import json
+import time
+import asyncio
+import hashlib
 import logging
-import requests
-from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, Request
+import threading
+import httpx
+from collections import OrderedDict
+from contextlib import asynccontextmanager, nullcontext
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
 from langchain_community.vectorstores import Chroma
 from langchain_ollama import OllamaEmbeddings
 
+from answer_cache import AnswerCache, context_fingerprint, ingest_version
+from context_packer import pack_context
+from lexical import LexicalIndex, index_version
+from page_index import PageIndexCache
+from query_expansion import expand_query
+from vector_index import VectorIndex
+import metrics
+from metrics import stage, record_stage, current_timings
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("rag")
 
 PERSIST_DIR = os.getenv("PERSIST_DIR", "./vector_store/chroma_fedex")
 EMBED_MODEL = "nomic-embed-text"
-OLLAMA_URL = "http://localhost:11434/api/generate"
+LLM_MODEL = os.getenv("LLM_MODEL", "llama3")
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/")
+OLLAMA_URL = f"{OLLAMA_BASE_URL}/api/generate"
 RELEVANCE_THRESHOLD = 0.3
-CONTEXT_BUDGET = 10000
+# Prompt context budget in (estimated) llama3 tokens, about 10000 characters.
+CONTEXT_TOKENS = int(os.getenv("CONTEXT_TOKENS", "2500"))
+# Per-chunk retrieval logging (scores + text previews) is costly on the hot path.
+LOG_CHUNKS = os.getenv("RAG_LOG_CHUNKS", "0") == "1"
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "512"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "100"))
+OLLAMA_MAX_KEEPALIVE = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "20"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+# Seconds Ollama keeps a model loaded after its last request (-1 = forever).
+OLLAMA_KEEP_ALIVE = int(os.getenv("OLLAMA_KEEP_ALIVE", "1800"))
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "1") == "1"
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "1") == "1"
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "5000"))
+BATCH_EMBED_SIZE = int(os.getenv("BATCH_EMBED_SIZE", "256"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+BM25_DIR = os.getenv("BM25_DIR", PERSIST_DIR.rstrip("/") + "_bm25")
+BM25_ENABLED = os.getenv("BM25_ENABLED", "1") == "1"
+# How often workers look for a BM25 index rebuilt by ingest.
+BM25_CHECK_SECONDS = float(os.getenv("BM25_CHECK_SECONDS", "30"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", ":memory:")
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+# "numpy" serves search from an exported, memory-mapped snapshot of the store.
+VECTOR_ENGINE = os.getenv("VECTOR_ENGINE", "chroma")
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", PERSIST_DIR.rstrip("/") + "_vectors")
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float32")
+VECTOR_INDEX_CHECK_SECONDS = float(os.getenv("VECTOR_INDEX_CHECK_SECONDS", "30"))
+# Read the whole snapshot once at startup so the first queries don't page-fault.
+VECTOR_INDEX_PRELOAD = os.getenv("VECTOR_INDEX_PRELOAD", "1") == "1"
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS", "5"))
+# Search only the products a question is about; questions naming more than
+# ROUTE_MAX_PRODUCTS products (or none) search the whole store.
+ROUTING_ENABLED = os.getenv("ROUTING_ENABLED", "1") == "1"
+ROUTE_MAX_PRODUCTS = int(os.getenv("ROUTE_MAX_PRODUCTS", "2"))
+# The page the extension is showing is chunked and embedded once per
+# (url, content hash); each question then gets its most relevant passages.
+PAGE_INDEX_ENABLED = os.getenv("PAGE_INDEX_ENABLED", "1") == "1"
+PAGE_INDEX_SIZE = int(os.getenv("PAGE_INDEX_SIZE", "64"))
+PAGE_CHUNK_CHARS = int(os.getenv("PAGE_CHUNK_CHARS", "800"))
+PAGE_MAX_CHARS = int(os.getenv("PAGE_MAX_CHARS", "100000"))
+PAGE_CONTEXT_TOKENS = int(os.getenv("PAGE_CONTEXT_TOKENS", "500"))
+
+embeddings = OllamaEmbeddings(model=EMBED_MODEL, base_url=OLLAMA_BASE_URL, keep_alive=OLLAMA_KEEP_ALIVE)
+
+# Everything slow is opened by initialize() after the worker is up (or on
+# first use); /readyz reports progress through `readiness`.
+def pending(state: str = "pending", **extra) -> Dict[str, Any]:
+        return {"state": state, "seconds": None, "error": None, **extra}
+
+readiness: Dict[str, Dict[str, Any]] = {
+        "store": pending(),
+        "embed_model": pending(model=EMBED_MODEL),
+        "llm_model": pending(model=LLM_MODEL),
+        "bm25": pending() if BM25_ENABLED else pending("disabled"),
+        "vector_index": pending() if VECTOR_ENGINE == "numpy" else pending("disabled"),
+}
+# Failures of these only degrade retrieval, so they don't block readiness.
+OPTIONAL_DEPENDENCIES = ("bm25", "vector_index")
+
+def mark(name: str, state: str, started: float, error: Optional[str] = None) -> None:
+        readiness[name].update(state=state, seconds=round(time.perf_counter() - started, 3), error=error)
+
+db: Optional[Chroma] = None
+_db_lock = threading.Lock()
+
+def get_db() -> Chroma:
+        """The Chroma store, opened on first use by whichever caller gets here first."""
+        global db
+        if db is None:
+                with _db_lock:
+                        if db is None:
+                                started = time.perf_counter()
+                                try:
+                                        store = Chroma(persist_directory=PERSIST_DIR, embedding_function=embeddings)
+                                        store._collection.count()
+                                except Exception as e:
+                                        mark("store", "failed", started, str(e))
+                                        raise
+                                db = store
+                                mark("store", "ready", started)
+                                logger.info(f"[startup] opened store {PERSIST_DIR} in {readiness['store']['seconds']}s")
+        return db
+
+lexical_index: Optional[LexicalIndex] = None
+vector_index: Optional[VectorIndex] = None
+
+def load_lexical_index() -> Optional[LexicalIndex]:
+        if not BM25_ENABLED:
+                return None
+        started = time.perf_counter()
+        if not os.path.isdir(BM25_DIR):
+                mark("bm25", "failed", started, f"no index at {BM25_DIR}")
+                return None
+        try:
+                index = LexicalIndex(BM25_DIR)
+        except Exception as e:
+                logger.warning(f"[bm25] could not load index at {BM25_DIR} ({e}), using vector search only")
+                mark("bm25", "failed", started, str(e))
+                return None
+        mark("bm25", "ready", started)
+        logger.info(f"[bm25] loaded {len(index)} chunks from {BM25_DIR}")
+        return index
+
+def refresh_lexical_index() -> None:
+        """Swaps in the BM25 index once ingest has published a new version of it."""
+        global lexical_index
+        version = index_version(BM25_DIR)
+        if version is None or (lexical_index is not None and lexical_index.version == version):
+                return
+        started = time.perf_counter()
+        try:
+                index = LexicalIndex(BM25_DIR)
+        except Exception as e:
+                logger.warning(f"[bm25] could not reload index at {BM25_DIR} ({e}), keeping the current one")
+                return
+        lexical_index = index
+        mark("bm25", "ready", started)
+        logger.info(f"[bm25] reloaded {len(index)} chunks from {BM25_DIR} (version {version})")
+
+def load_vector_index() -> Optional[VectorIndex]:
+        if VECTOR_ENGINE != "numpy":
+                return None
+        started = time.perf_counter()
+        try:
+                index = VectorIndex(get_db(), VECTOR_INDEX_DIR, dtype=VECTOR_INDEX_DTYPE, preload=VECTOR_INDEX_PRELOAD)
+        except Exception as e:
+                logger.warning(f"[vector-index] could not build snapshot in {VECTOR_INDEX_DIR} ({e}), using Chroma search")
+                mark("vector_index", "failed", started, str(e))
+                return None
+        mark("vector_index", "ready", started)
+        return index
+
+class EmbeddingCache:
+        """Bounded LRU of expanded query -> embedding, shared across requests."""
+
+        def __init__(self, maxsize: int):
+                self.maxsize = maxsize
+                self.hits = 0
+                self.misses = 0
+                self._data: "OrderedDict[str, List[float]]" = OrderedDict()
+                self._lock = threading.Lock()
+
+        def _lookup(self, text: str) -> Optional[List[float]]:
+                with self._lock:
+                        vec = self._data.get(text)
+                        if vec is not None:
+                                self._data.move_to_end(text)
+                                self.hits += 1
+                        else:
+                                self.misses += 1
+                        return vec
+
+        def _store(self, text: str, vec: List[float]) -> None:
+                if self.maxsize <= 0:
+                        return
+                with self._lock:
+                        self._data[text] = vec
+                        self._data.move_to_end(text)
+                        while len(self._data) > self.maxsize:
+                                self._data.popitem(last=False)
+
+        async def aget(self, text: str) -> List[float]:
+                vec = self._lookup(text)
+                if vec is None:
+                        vec = await embeddings.aembed_query(text)
+                        self._store(text, vec)
+                return vec
+
+        async def aget_many(self, texts: List[str]) -> List[List[float]]:
+                """Embed all cache misses in batched calls instead of one call per text."""
+                found = {t: self._lookup(t) for t in dict.fromkeys(texts)}
+                missing = [t for t, vec in found.items() if vec is None]
+                for i in range(0, len(missing), BATCH_EMBED_SIZE):
+                        batch = missing[i:i + BATCH_EMBED_SIZE]
+                        for t, vec in zip(batch, await embeddings.aembed_documents(batch)):
+                                self._store(t, vec)
+                                found[t] = vec
+                return [found[t] for t in texts]
+
+        def stats(self) -> Dict[str, int]:
+                with self._lock:
+                        return {
+                                "size": len(self._data),
+                                "maxsize": self.maxsize,
+                                "hits": self.hits,
+                                "misses": self.misses,
+                        }
+
+embedding_cache = EmbeddingCache(EMBED_CACHE_SIZE)
+
+async def aembed_passages(texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for i in range(0, len(texts), BATCH_EMBED_SIZE):
+                vectors.extend(await embeddings.aembed_documents(texts[i:i + BATCH_EMBED_SIZE]))
+        return vectors
+
+page_index_cache = PageIndexCache(
+        aembed_passages,
+        maxsize=PAGE_INDEX_SIZE,
+        chunk_chars=PAGE_CHUNK_CHARS,
+        max_chars=PAGE_MAX_CHARS,
+        whole_tokens=PAGE_CONTEXT_TOKENS,
+)
+answer_cache = AnswerCache(
+        path=ANSWER_CACHE_PATH,
+        maxsize=ANSWER_CACHE_SIZE,
+        ttl=ANSWER_CACHE_TTL,
+        threshold=ANSWER_CACHE_THRESHOLD,
+) if ANSWER_CACHE_ENABLED else None
+
+REQUESTS = metrics.register(metrics.Counter("rag_requests_total", "Chat requests served, by endpoint and answer-cache hit."))
+REQUEST_SECONDS = metrics.register(metrics.Histogram("rag_request_seconds", "End-to-end chat latency up to the final answer."))
+LLM_TOKENS = metrics.register(metrics.Counter("rag_llm_tokens_total", "Tokens evaluated by Ollama (kind=prompt|eval)."))
+COALESCED = metrics.register(metrics.Counter("rag_coalesced_total", "Chat requests that joined an identical in-flight request."))
+ROUTED = metrics.register(metrics.Counter("rag_retrieval_scope_total", "Retrievals by scope (routed to products or global)."))
+LLM_EVAL_SECONDS = metrics.register(metrics.Counter("rag_llm_eval_seconds_total", "Ollama-reported evaluation time (kind=prompt|eval)."))
+
+def cache_gauges() -> Dict[tuple, float]:
+        values = {}
+        caches = {"embedding": embedding_cache.stats(), "page_index": page_index_cache.stats()}
+        if answer_cache is not None:
+                caches["answer"] = answer_cache.stats()
+        for name, stats in caches.items():
+                for field in ("size", "hits", "misses"):
+                        values[(("cache", name), ("field", field))] = stats[field]
+        return values
 
-embeddings = OllamaEmbeddings(model=EMBED_MODEL)
-db = Chroma(persist_directory=PERSIST_DIR, embedding_function=embeddings)
+metrics.register(metrics.Gauge("rag_cache", "Embedding, page index and answer cache size and hit/miss totals.", cache_gauges))
 
-app = FastAPI()
+# Keep-alive connection pool for Ollama: one httpx.AsyncClient shared by
+# every request.
+ollama_timeout = httpx.Timeout(OLLAMA_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT)
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+        global _http_client
+        if _http_client is None or _http_client.is_closed:
+                _http_client = httpx.AsyncClient(
+                        timeout=ollama_timeout,
+                        limits=httpx.Limits(
+                                max_connections=OLLAMA_MAX_CONNECTIONS,
+                                max_keepalive_connections=OLLAMA_MAX_KEEPALIVE,
+                        ),
+                )
+        return _http_client
+
+async def open_store() -> None:
+        while True:
+                try:
+                        await run_in_threadpool(get_db)
+                        return
+                except Exception as e:
+                        logger.warning(f"[startup] store unavailable ({e}), retrying in {STARTUP_RETRY_SECONDS}s")
+                        await asyncio.sleep(STARTUP_RETRY_SECONDS)
+
+# Background tasks that pick up re-ingested indexes; cancelled on shutdown.
+_watchers: List["asyncio.Task"] = []
+
+async def watch(name: str, seconds: float, refresh: Callable[[], None]) -> None:
+        while True:
+                await asyncio.sleep(seconds)
+                try:
+                        await run_in_threadpool(refresh)
+                except Exception as e:
+                        logger.warning(f"[{name}] refresh failed ({e})")
+
+async def load_indexes() -> None:
+        global lexical_index, vector_index
+        lexical_index = await run_in_threadpool(load_lexical_index)
+        if BM25_ENABLED:
+                _watchers.append(asyncio.create_task(watch("bm25", BM25_CHECK_SECONDS, refresh_lexical_index)))
+        await open_store()
+        vector_index = await run_in_threadpool(load_vector_index)
+        if vector_index is not None:
+                # The store scan and any snapshot export run here, never inside a search.
+                _watchers.append(asyncio.create_task(watch("vector-index", VECTOR_INDEX_CHECK_SECONDS, vector_index.refresh)))
+
+async def initialize() -> None:
+        """Background startup: store, indexes and model warm-up run concurrently."""
+        started = time.perf_counter()
+        steps = [load_indexes()]
+        if OLLAMA_WARMUP:
+                steps.append(warm_models())
+        else:
+                for name in ("embed_model", "llm_model"):
+                        readiness[name]["state"] = "disabled"
+        await asyncio.gather(*steps)
+        logger.info(f"[startup] initialized in {time.perf_counter() - started:.2f}s")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+        init = asyncio.create_task(initialize())
+        yield
+        init.cancel()
+        for task in _watchers:
+                task.cancel()
+        if _http_client is not None:
+                await _http_client.aclose()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
@@ -36,53 +354,44 @@ class ChatRequest(BaseModel):
         message: str
         page_url: Optional[str] = None
         page_text: Optional[str] = None
+        timings: bool = False
 
 class RetrieveRequest(BaseModel):
         message: str
         k: int = 8
 
-QUERY_EXPANSION_MAP = {
-        r"\bship\b": "Ship API createShipment shipment",
-        r"\bshipping\b": "Ship API createShipment shipment",
-        r"\bground\b": "FEDEX_GROUND serviceType ground shipping",
-        r"\bexpress\b": "FEDEX_EXPRESS serviceType express",
-        r"\bovernight\b": "STANDARD_OVERNIGHT PRIORITY_OVERNIGHT serviceType",
-        r"\b2\s*day\b": "FEDEX_2_DAY serviceType",
-        r"\btrack\b": "Track API tracking trackByTrackingNumber",
-        r"\btracking\b": "Track API tracking trackByTrackingNumber",
-        r"\brate\b": "Rate API getRates rateRequest",
-        r"\brates\b": "Rate API getRates rateRequest",
-        r"\bquote\b": "Rate API getRates rateRequest quote",
-        r"\blabel\b": "Ship API label createShipment labelSpecification",
-        r"\bauth\b": "OAuth authentication client_credentials token",
-        r"\boauth\b": "OAuth authentication client_credentials token",
-        r"\baddress\b": "Address Validation API validateAddress",
-        r"\bvalidat\w*\b": "Address Validation API validateAddress",
-        r"\bwebhook\b": "Shipment Visibility Webhook notification",
-        r"\bpickup\b": "pickup schedulePickup CONTACT_FEDEX_TO_SCHEDULE",
-        r"\bweight\b": "weight units LB KG packageWeight",
-        r"\bdimension\b": "dimensions length width height IN CM",
-        r"\bpackage\b": "packageLineItems packageCount YOUR_PACKAGING",
-        r"\brecipient\b": "recipient recipientAddress contact",
-        r"\bshipper\b": "shipper shipperAddress contact accountNumber",
-        r"\baccount\b": "accountNumber shippingChargesPayment",
-        r"\brequired\b": "required mandatory fields parameters",
-        r"\bparameter\b": "parameters request body fields schema",
-        r"\bendpoint\b": "endpoint URL POST request path",
+class BatchRetrieveRequest(BaseModel):
+        messages: List[str]
+        k: int = 8
+
+class BatchChatRequest(BaseModel):
+        items: List[ChatRequest]
+        stream: bool = False
+
+# Question pattern -> `product` partitions (slugs from ingest.product_from_url()).
+PRODUCT_ROUTES = {
+        r"\bship(ping|ment)?\b|\blabel\b|\bcreateshipment\b": ["ship"],
+        r"\btrack(ing)?\b|\btrackbytrackingnumber\b": ["track"],
+        r"\brates?\b|\bquote\b|\bgetrates\b": ["rate"],
+        r"\baddress\b|\bvalidat\w*\b": ["address-validation"],
+        r"\bwebhooks?\b|\bvisibility\b": ["shipment-visibility-webhook"],
+        r"\bauth\b|\boauth\b|\baccess[_ ]token\b|\bclient_credentials\b": ["authorization", "guides"],
 }
 
-def expand_query(question: str) -> str:
+def route_products(question: str) -> Optional[List[str]]:
+        """Products the question targets, or None to search everything."""
+        if not ROUTING_ENABLED:
+                return None
         lower_q = question.lower()
-        expansions = []
-        for pattern, terms in QUERY_EXPANSION_MAP.items():
+        products: List[str] = []
+        matched = 0
+        for pattern, targets in PRODUCT_ROUTES.items():
                 if re.search(pattern, lower_q):
-                        expansions.append(terms)
-        if expansions:
-                expanded = question + " " + " ".join(expansions)
-                logger.info(f"[expand] original: {question}")
-                logger.info(f"[expand] expanded: {expanded[:200]}...")
-                return expanded
-        return question
+                        matched += 1
+                        products.extend(t for t in targets if t not in products)
+        if not products or matched > ROUTE_MAX_PRODUCTS:
+                return None
+        return products
 
 SYSTEM_PROMPT = (
         "You are a FedEx Developer API assistant. Your job is to answer questions "
@@ -102,21 +411,17 @@ SYSTEM_PROMPT = (
         "7. Be thorough — include all relevant fields, parameters, and details from the context.\n\n"
 )
 
-def build_prompt(question: str, contexts: list, page_url: Optional[str], page_text: Optional[str]) -> str:
-        ctx_blocks = []
-        total = 0
-        for c in contexts:
-                url = c.metadata.get("source", "unknown")
-                txt = c.page_content.strip()
-                if total + len(txt) > CONTEXT_BUDGET:
-                        txt = txt[:CONTEXT_BUDGET - total]
-                ctx_blocks.append(f"[Source: {url}]\n{txt}")
-                total += len(txt)
-                if total >= CONTEXT_BUDGET:
-                        break
+def build_prompt(question: str, contexts: list, page_url: Optional[str], page_text: Optional[str],
+                 page_passages: Optional[List[str]] = None) -> str:
+        blocks, tokens = pack_context(contexts, CONTEXT_TOKENS)
+        logger.info(f"[prompt] packed {len(contexts)} chunks into {len(blocks)} blocks (~{tokens} tokens)")
+        ctx_blocks = [f"[Source: {url}]\n{txt}" for url, txt in blocks]
 
         page_hint = ""
-        if page_text:
+        if page_passages:
+                page_hint = f"\n[CurrentPage: {page_url}]\n" + "\n...\n".join(page_passages)
+        elif page_text:
+                # Page index disabled or unavailable: fall back to the head of the page.
                 trimmed = page_text.strip().replace("\r", "").replace("\t", " ")
                 page_hint = f"\n[CurrentPage: {page_url}]\n{trimmed[:1500]}"
 
@@ -126,41 +431,151 @@ def build_prompt(question: str, contexts: list, page_url: Optional[str], page_te
                 context = "(No relevant documentation was found for this query.)"
 
         return (
-                f"{SYSTEM_PROMPT}"
                 f"DOCUMENTATION CONTEXT:\n{context}{page_hint}\n\n"
                 f"USER QUESTION: {question}\n\n"
                 f"ANSWER (using only the context above):"
         )
 
-def retrieve(question: str, page_url: Optional[str], k: int = 8) -> list:
-        expanded = expand_query(question)
+def product_filter(products: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+        return {"product": {"$in": products}} if products else None
+
+def scored_search(query_vec: List[float], k: int, products: Optional[List[str]] = None) -> list:
+        # Chroma's by-vector search returns raw distances; convert them with the
+        # same relevance function similarity_search_with_relevance_scores uses.
+        relevance = get_db()._select_relevance_score_fn()
+        where = product_filter(products)
+        if vector_index is not None:
+                hits = vector_index.similarity_search_with_distance(query_vec, k=k, where=where)
+        else:
+                hits = get_db().similarity_search_by_vector_with_relevance_scores(query_vec, k=k, filter=where)
+        return [(doc, relevance(dist)) for doc, dist in hits]
+
+async def aembed_question(question: str) -> List[float]:
+        with stage("expand"):
+                expanded = expand_query(question)
         logger.info(f"[retrieve] query: {expanded[:150]}")
+        with stage("embed"):
+                return await embedding_cache.aget(expanded)
+
+async def aembed_questions(questions: List[str]) -> List[List[float]]:
+        with stage("expand"):
+                expanded = [expand_query(q) for q in questions]
+        with stage("embed"):
+                return await embedding_cache.aget_many(expanded)
+
+async def apage_passages(req: ChatRequest, query_vec: List[float]) -> Optional[List[str]]:
+        """Passages of the page the user is on that best match the question."""
+        if not PAGE_INDEX_ENABLED or not (req.page_text or "").strip():
+                return None
+        with stage("page_index"):
+                try:
+                        index = await page_index_cache.get(req.page_url or "", req.page_text)
+                except Exception as e:
+                        logger.warning(f"[page-index] indexing {req.page_url} failed ({e}), using the page head")
+                        return None
+                passages = index.passages(query_vec, PAGE_CONTEXT_TOKENS)
+        logger.info(f"[page-index] {len(passages)}/{len(index.chunks)} passages from {req.page_url}")
+        return passages
 
+async def aretrieve(question: str, page_url: Optional[str], k: int = 8, query_vec: Optional[List[float]] = None) -> list:
+        if query_vec is None:
+                query_vec = await aembed_question(question)
+        # Chroma's search is blocking (SQLite + HNSW), so keep it off the event loop.
+        return await run_in_threadpool(search, query_vec, page_url, k, question)
+
+def rrf_fuse(rankings: List[list], limit: int) -> list:
+        """Reciprocal rank fusion of several ranked Document lists."""
+        scores: Dict[Any, float] = {}
+        docs: Dict[Any, Any] = {}
+        for ranking in rankings:
+                for rank, doc in enumerate(ranking):
+                        key = (doc.metadata.get("source"), doc.page_content)
+                        docs.setdefault(key, doc)
+                        scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+        order = sorted(scores, key=scores.get, reverse=True)
+        return [docs[key] for key in order[:limit]]
+
+def search(query_vec: List[float], page_url: Optional[str], k: int = 8, question: Optional[str] = None) -> list:
+        products = route_products(question) if question else None
+        hits = vector_search(query_vec, k, products) if products else []
+        if products and not hits:
+                # Nothing in the routed partitions clears the threshold (or the
+                # store predates product tags): routing was unsure, search everything.
+                logger.info(f"[retrieve] no confident hits in {products}, searching all products")
+                products = None
+        if not products:
+                hits = vector_search(query_vec, k)
+        else:
+                logger.info(f"[retrieve] routed to {products}")
+        ROUTED.inc(scope="routed" if products else "global")
+
+        # BM25 over the raw question catches exact API identifiers that the
+        # embedding blurs; it needs no extra embedding call.
+        if lexical_index is not None and question:
+                with stage("bm25"):
+                        if products:
+                                lexical_hits = [
+                                        doc for doc, _ in lexical_index.search(question, k=k * 3)
+                                        if doc.metadata.get("product") in products
+                                ][:k]
+                        else:
+                                lexical_hits = [doc for doc, _ in lexical_index.search(question, k=k)]
+                logger.info(f"[retrieve] BM25 returned {len(lexical_hits)} results")
+                hits = rrf_fuse([hits, lexical_hits], limit=max(k, len(hits)))
+
+        if page_url:
+                for h in hits:
+                        if page_url in (h.metadata.get("source") or ""):
+                                hits.remove(h)
+                                hits.insert(0, h)
+                                break
+        return hits
+
+def vector_search(query_vec: List[float], k: int = 8, products: Optional[List[str]] = None) -> list:
+        """
+        Scored search, relevance threshold, then MMR. With `products` the search
+        is limited to those partitions and returns [] when nothing passes the
+        threshold, so the caller can fall back to a global search.
+        """
+        where = product_filter(products)
         try:
-                scored_hits = db.similarity_search_with_relevance_scores(expanded, k=k)
+                with stage("vector_search"):
+                        scored_hits = scored_search(query_vec, k, products)
         except Exception as e:
+                if products:
+                        logger.warning(f"[retrieve] routed search failed ({e})")
+                        return []
                 logger.warning(f"[retrieve] scored search failed ({e}), falling back to basic search")
-                hits = db.similarity_search(expanded, k=k)
-                for h in hits:
-                        logger.info(f"  chunk: score=N/A src={h.metadata.get('source', '?')[:80]} text={h.page_content[:80]}...")
+                with stage("vector_search"):
+                        hits = get_db().similarity_search_by_vector(query_vec, k=k)
+                if LOG_CHUNKS:
+                        for h in hits:
+                                logger.info(f"  chunk: score=N/A src={h.metadata.get('source', '?')[:80]} text={h.page_content[:80]}...")
                 return hits
 
         logger.info(f"[retrieve] got {len(scored_hits)} results")
         filtered = []
         for doc, score in scored_hits:
-                src = doc.metadata.get("source", "?")
-                logger.info(f"  chunk: score={score:.3f} src={src[:80]} text={doc.page_content[:80]}...")
+                if LOG_CHUNKS:
+                        src = doc.metadata.get("source", "?")
+                        logger.info(f"  chunk: score={score:.3f} src={src[:80]} text={doc.page_content[:80]}...")
                 if score >= RELEVANCE_THRESHOLD:
                         filtered.append(doc)
-                else:
+                elif LOG_CHUNKS:
                         logger.info(f"  -> filtered out (below threshold {RELEVANCE_THRESHOLD})")
 
+        if not filtered and products:
+                return []
         if not filtered:
                 logger.warning("[retrieve] all chunks below threshold, returning top 3 anyway")
                 filtered = [doc for doc, _ in scored_hits[:3]]
 
         try:
-                mmr_hits = db.max_marginal_relevance_search(expanded, k=min(k, len(filtered)), fetch_k=k * 2)
+                with stage("mmr"):
+                        if vector_index is not None:
+                                mmr_hits = vector_index.max_marginal_relevance_search(query_vec, k=min(k, len(filtered)), fetch_k=k * 2, where=where)
+                        else:
+                                mmr_hits = get_db().max_marginal_relevance_search_by_vector(query_vec, k=min(k, len(filtered)), fetch_k=k * 2, filter=where)
                 logger.info(f"[retrieve] MMR returned {len(mmr_hits)} diverse results")
 
                 mmr_sources = {h.page_content[:100] for h in mmr_hits}
@@ -168,64 +583,424 @@ def retrieve(question: str, page_url: Optional[str], k: int = 8) -> list:
                         if f.page_content[:100] not in mmr_sources:
                                 mmr_hits.append(f)
 
-                if page_url:
-                        for h in mmr_hits:
-                                if page_url in (h.metadata.get("source") or ""):
-                                        mmr_hits.remove(h)
-                                        mmr_hits.insert(0, h)
-                                        break
-
                 return mmr_hits
         except Exception as e:
                 logger.warning(f"[retrieve] MMR failed ({e}), using filtered results")
                 return filtered
 
-def call_ollama(prompt: str, model: str = "llama3", temperature: float = 0.1) -> str:
-        payload = {
+def ollama_payload(prompt: str, model: str, temperature: float, stream: bool) -> Dict[str, Any]:
+        # SYSTEM_PROMPT goes in Ollama's `system` field, so every request starts
+        # with the same templated prefix and Ollama can reuse its KV cache.
+        return {
                 "model": model,
+                "system": SYSTEM_PROMPT.strip(),
                 "prompt": prompt,
-                "stream": False,
+                "stream": stream,
+                "keep_alive": OLLAMA_KEEP_ALIVE,
                 "options": {"temperature": temperature}
         }
-        r = requests.post(OLLAMA_URL, json=payload, timeout=120)
-        r.raise_for_status()
-        data = r.json()
-        return data.get("response", "")
 
-@app.post("/chat")
-def chat(req: ChatRequest):
-        logger.info(f"[chat] question: {req.message[:100]}")
-        hits = retrieve(req.message, req.page_url, k=8)
-        prompt = build_prompt(req.message, hits, req.page_url, req.page_text)
+async def warm_model(name: str, path: str, payload: Dict[str, Any]) -> None:
+        """Retry until the model answers, so readiness recovers once Ollama is up."""
+        model = readiness[name]["model"]
+        while True:
+                started = time.perf_counter()
+                try:
+                        r = await get_http_client().post(f"{OLLAMA_BASE_URL}{path}", json=payload)
+                        r.raise_for_status()
+                except Exception as e:
+                        mark(name, "failed", started, str(e) or type(e).__name__)
+                        logger.warning(f"[warmup] {model} failed ({readiness[name]['error']}), retrying in {STARTUP_RETRY_SECONDS}s")
+                        await asyncio.sleep(STARTUP_RETRY_SECONDS)
+                        continue
+                mark(name, "ready", started)
+                logger.info(f"[warmup] {model} loaded in {readiness[name]['seconds']}s")
+                return
+
+async def warm_models() -> None:
+        """
+        Load both models ahead of the first request. The LLM warm-up also
+        evaluates the system prompt once, so its KV cache is already primed.
+        """
+        llm = ollama_payload("ping", LLM_MODEL, 0.0, stream=False)
+        llm["options"]["num_predict"] = 1
+        await asyncio.gather(
+                warm_model("embed_model", "/api/embed", {"model": EMBED_MODEL, "input": "warm-up", "keep_alive": OLLAMA_KEEP_ALIVE}),
+                warm_model("llm_model", "/api/generate", llm),
+        )
+
+def record_llm(ttft: Optional[float], total: float, final: Dict[str, Any]) -> None:
+        if ttft is not None:
+                record_stage("llm_first_token", ttft)
+        record_stage("llm_total", total)
+        if final.get("eval_count"):
+                LLM_TOKENS.inc(final["eval_count"], kind="eval")
+        if final.get("prompt_eval_count"):
+                LLM_TOKENS.inc(final["prompt_eval_count"], kind="prompt")
+        if final.get("eval_duration"):
+                LLM_EVAL_SECONDS.inc(final["eval_duration"] / 1e9, kind="eval")
+        if final.get("prompt_eval_duration"):
+                LLM_EVAL_SECONDS.inc(final["prompt_eval_duration"] / 1e9, kind="prompt")
+
+async def acall_ollama(prompt: str, model: str = LLM_MODEL, temperature: float = 0.1) -> str:
+        # Streams under the hood so time-to-first-token is measurable for /chat too.
+        started = time.perf_counter()
+        ttft = None
+        tokens: List[str] = []
+        final: Dict[str, Any] = {}
+        async for chunk in astream_ollama(prompt, model, temperature):
+                token = chunk.get("response", "")
+                if token:
+                        if ttft is None:
+                                ttft = time.perf_counter() - started
+                        tokens.append(token)
+                if chunk.get("done"):
+                        final = chunk
+        record_llm(ttft, time.perf_counter() - started, final)
+        return "".join(tokens)
+
+async def astream_ollama(prompt: str, model: str = LLM_MODEL, temperature: float = 0.1):
+        """Yield Ollama's NDJSON chunks as they arrive; the last one has done=True."""
+        payload = ollama_payload(prompt, model, temperature, stream=True)
+        async with get_http_client().stream("POST", OLLAMA_URL, json=payload) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                        if line:
+                                yield json.loads(line)
+
+def collect_sources(hits: list) -> List[str]:
+        return list({h.metadata.get("source", "unknown") for h in hits})
+
+async def lookup_answer(query_vec: List[float], hits: list, req: ChatRequest) -> Optional[Dict[str, Any]]:
+        if answer_cache is None:
+                return None
+        with stage("answer_cache"):
+                fingerprint = context_fingerprint(hits, req.page_url, req.page_text)
+                await run_in_threadpool(answer_cache.sync_version, ingest_version(hits))
+                cached = await run_in_threadpool(answer_cache.lookup, query_vec, fingerprint)
+        if cached is not None:
+                logger.info(f"[cache] answer hit (similarity {cached['similarity']})")
+        return cached
+
+async def store_answer(query_vec: List[float], hits: list, req: ChatRequest, answer: str, sources: List[str]) -> None:
+        if answer_cache is None or not answer:
+                return
+        fingerprint = context_fingerprint(hits, req.page_url, req.page_text)
+        await run_in_threadpool(answer_cache.store, query_vec, fingerprint, answer, sources)
+
+def finish_request(endpoint: str, started: float, cached: bool, response: Dict[str, Any], timings: Optional[Dict[str, float]]) -> Dict[str, Any]:
+        REQUESTS.inc(endpoint=endpoint, cached=str(cached).lower())
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+        if timings is not None:
+                timings["total"] = round((time.perf_counter() - started) * 1000, 2)
+                response["timings"] = timings
+        return response
+
+def ndjson(event: Dict[str, Any]) -> str:
+        return json.dumps(event) + "\n"
+
+async def run_chat(req: ChatRequest, query_vec: Optional[List[float]] = None, llm_limit: Optional[asyncio.Semaphore] = None) -> Dict[str, Any]:
+        """Retrieval, answer cache and generation for one question."""
+        if query_vec is None:
+                query_vec = await aembed_question(req.message)
+        hits, page_passages = await asyncio.gather(
+                aretrieve(req.message, req.page_url, k=8, query_vec=query_vec),
+                apage_passages(req, query_vec),
+        )
+        cached = await lookup_answer(query_vec, hits, req)
+        if cached is not None:
+                return {"answer": cached["answer"], "sources": cached["sources"], "cached": True}
+
+        with stage("prompt_build"):
+                prompt = build_prompt(req.message, hits, req.page_url, req.page_text, page_passages)
         logger.info(f"[chat] prompt length: {len(prompt)} chars, context chunks: {len(hits)}")
-        answer = call_ollama(prompt)
-        sources = list({h.metadata.get("source", "unknown") for h in hits})
+        async with llm_limit or nullcontext():
+                answer = await acall_ollama(prompt)
+        sources = collect_sources(hits)
         logger.info(f"[chat] answer length: {len(answer)}, sources: {sources}")
-        return {"answer": answer, "sources": sources}
+        await store_answer(query_vec, hits, req, answer, sources)
+        return {"answer": answer, "sources": sources, "cached": False}
 
-@app.post("/debug/retrieve")
-def debug_retrieve(req: RetrieveRequest):
-        expanded = expand_query(req.message)
-        logger.info(f"[debug] query: {expanded[:150]}")
+def coalesce_key(req: ChatRequest) -> str:
+        question = " ".join(req.message.lower().split()).rstrip("?!. ")
+        page = hashlib.sha1((req.page_text or "").encode("utf-8")).hexdigest()
+        return f"{question}\0{req.page_url or ''}\0{page}"
+
+# Single-flight: identical questions on the same page share one in-progress
+# retrieval + generation. Everything runs on one event loop per worker, so
+# plain dicts are enough. Every caller is counted in the request metrics, but
+# the stages ran once, for the caller that started them: a joiner's
+# `timings` only has its own `total`.
+_inflight: Dict[str, "asyncio.Task"] = {}
+_inflight_streams: Dict[str, "SharedStream"] = {}
+
+async def coalesced(key: str, endpoint: str, factory: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        task = _inflight.get(key)
+        if task is not None:
+                COALESCED.inc(endpoint=endpoint)
+                logger.info(f"[{endpoint}] joined in-flight request")
+                return {**await asyncio.shield(task), "coalesced": True}
+
+        task = asyncio.create_task(factory())
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _inflight.pop(key, None) if _inflight.get(key) is t else None)
+        # Shielded so a disconnecting first caller doesn't cancel it for the others.
+        return dict(await asyncio.shield(task))
+
+class SharedStream:
+        """Runs one event stream in the background and replays it to every subscriber."""
+
+        def __init__(self, source: AsyncIterator[Dict[str, Any]], on_done: Callable[[], None]):
+                self.events: List[Dict[str, Any]] = []
+                self.done = False
+                self._cond = asyncio.Condition()
+                self._on_done = on_done
+                self._task = asyncio.create_task(self._pump(source))
+
+        async def _pump(self, source: AsyncIterator[Dict[str, Any]]) -> None:
+                try:
+                        async for event in source:
+                                async with self._cond:
+                                        self.events.append(event)
+                                        self._cond.notify_all()
+                except Exception as e:
+                        logger.warning(f"[chat/stream] shared stream failed ({e})")
+                        async with self._cond:
+                                self.events.append({"type": "error", "error": str(e)})
+                finally:
+                        async with self._cond:
+                                self.done = True
+                                self._cond.notify_all()
+                        self._on_done()
+
+        async def subscribe(self) -> AsyncIterator[Dict[str, Any]]:
+                i = 0
+                while True:
+                        async with self._cond:
+                                while i >= len(self.events) and not self.done:
+                                        await self._cond.wait()
+                                if i >= len(self.events):
+                                        return
+                                event = self.events[i]
+                        i += 1
+                        yield event
+
+@app.post("/chat")
+async def chat(req: ChatRequest):
+        logger.info(f"[chat] question: {req.message[:100]}")
+        started = time.perf_counter()
+        timings = {} if req.timings else None
+        current_timings.set(timings)
+        if COALESCE_ENABLED:
+                response = await coalesced(coalesce_key(req), "chat", lambda: run_chat(req))
+        else:
+                response = await run_chat(req)
+        return finish_request("chat", started, response["cached"], response, timings)
+
+def check_batch_size(n: int) -> None:
+        if n > BATCH_MAX_ITEMS:
+                raise HTTPException(status_code=413, detail=f"batch of {n} exceeds BATCH_MAX_ITEMS={BATCH_MAX_ITEMS}")
+
+def retrieve_result(hits: list) -> Dict[str, Any]:
+        return {
+                "sources": collect_sources(hits),
+                "results": [
+                        {
+                                "source": doc.metadata.get("source", "unknown"),
+                                "content_preview": doc.page_content[:500],
+                                "content_length": len(doc.page_content),
+                        }
+                        for doc in hits
+                ],
+        }
+
+@app.post("/batch/retrieve")
+async def batch_retrieve(req: BatchRetrieveRequest):
+        """Retrieve for many questions with one batched embedding pass."""
+        check_batch_size(len(req.messages))
+        logger.info(f"[batch/retrieve] {len(req.messages)} questions")
+        vectors = await aembed_questions(req.messages)
+        hit_lists = await asyncio.gather(*(
+                aretrieve(q, None, k=req.k, query_vec=vec) for q, vec in zip(req.messages, vectors)
+        ))
+        return {"results": [{"query": q, **retrieve_result(hits)} for q, hits in zip(req.messages, hit_lists)]}
+
+@app.post("/batch/chat")
+async def batch_chat(req: BatchChatRequest):
+        """
+        Answer many questions: batched embedding, concurrent retrieval, and at
+        most BATCH_LLM_CONCURRENCY generations in flight. Results come back in
+        order, or with stream=true as NDJSON lines tagged with their index as
+        each one finishes.
+        """
+        check_batch_size(len(req.items))
+        logger.info(f"[batch/chat] {len(req.items)} questions")
+        vectors = await aembed_questions([item.message for item in req.items])
+        llm_limit = asyncio.Semaphore(max(1, BATCH_LLM_CONCURRENCY))
+
+        async def one(i: int) -> Dict[str, Any]:
+                try:
+                        response = await run_chat(req.items[i], vectors[i], llm_limit)
+                except Exception as e:
+                        logger.warning(f"[batch/chat] item {i} failed ({e})")
+                        return {"index": i, "error": str(e)}
+                REQUESTS.inc(endpoint="batch_chat", cached=str(response["cached"]).lower())
+                return {"index": i, **response}
+
+        if not req.stream:
+                return {"results": await asyncio.gather(*(one(i) for i in range(len(req.items))))}
+
+        async def events():
+                for fut in asyncio.as_completed([one(i) for i in range(len(req.items))]):
+                        yield ndjson(await fut)
+
+        return StreamingResponse(events(), media_type="application/x-ndjson")
+
+async def stream_chat(req: ChatRequest, started: float) -> AsyncIterator[Dict[str, Any]]:
+        """Events for one question: sources, then tokens, then done (or error)."""
+        try:
+                query_vec = await aembed_question(req.message)
+                hits, page_passages = await asyncio.gather(
+                        aretrieve(req.message, req.page_url, k=8, query_vec=query_vec),
+                        apage_passages(req, query_vec),
+                )
+                cached = await lookup_answer(query_vec, hits, req)
+        except Exception as e:
+                logger.warning(f"[chat/stream] retrieval failed ({e})")
+                yield {"type": "error", "error": str(e)}
+                return
+        retrieval_ms = (time.perf_counter() - started) * 1000
+
+        if cached is not None:
+                yield {"type": "sources", "sources": cached["sources"]}
+                yield {"type": "token", "text": cached["answer"]}
+                done = {
+                        "type": "done",
+                        "cached": True,
+                        "stats": {
+                                "retrieval_ms": round(retrieval_ms, 1),
+                                "total_ms": round((time.perf_counter() - started) * 1000, 1),
+                        },
+                }
+                yield done
+                return
+
+        with stage("prompt_build"):
+                prompt = build_prompt(req.message, hits, req.page_url, req.page_text, page_passages)
+        sources = collect_sources(hits)
+
+        yield {"type": "sources", "sources": sources}
+        llm_started = time.perf_counter()
+        llm_ttft = None
+        first_token_ms = None
+        tokens: List[str] = []
+        final: Dict[str, Any] = {}
+        try:
+                async for chunk in astream_ollama(prompt):
+                        token = chunk.get("response", "")
+                        if token:
+                                if first_token_ms is None:
+                                        llm_ttft = time.perf_counter() - llm_started
+                                        first_token_ms = (time.perf_counter() - started) * 1000
+                                tokens.append(token)
+                                yield {"type": "token", "text": token}
+                        if chunk.get("done"):
+                                final = chunk
+        except Exception as e:
+                logger.warning(f"[chat/stream] generation failed ({e})")
+                yield {"type": "error", "error": str(e)}
+                return
+
+        record_llm(llm_ttft, time.perf_counter() - llm_started, final)
+        total_ms = (time.perf_counter() - started) * 1000
+        answer = "".join(tokens)
+        logger.info(f"[chat/stream] answer length: {len(answer)}, first token: {first_token_ms} ms, total: {total_ms:.0f} ms")
+        await store_answer(query_vec, hits, req, answer, sources)
+        done = {
+                "type": "done",
+                "cached": False,
+                "stats": {
+                        "retrieval_ms": round(retrieval_ms, 1),
+                        "first_token_ms": round(first_token_ms, 1) if first_token_ms is not None else None,
+                        "total_ms": round(total_ms, 1),
+                        "eval_count": final.get("eval_count"),
+                        "eval_duration_ms": final["eval_duration"] / 1e6 if final.get("eval_duration") else None,
+                        "prompt_eval_count": final.get("prompt_eval_count"),
+                },
+        }
+        yield done
+
+async def respond_stream(events: AsyncIterator[Dict[str, Any]], started: float,
+                         timings: Optional[Dict[str, float]], joined: bool = False) -> AsyncIterator[str]:
+        """One caller's NDJSON stream; its done event records the request like /chat does."""
+        async for event in events:
+                if event["type"] == "done":
+                        done = {**event, "coalesced": True} if joined else dict(event)
+                        event = finish_request("chat_stream", started, event["cached"], done, timings)
+                yield ndjson(event)
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+        """Streaming /chat; identical concurrent questions share one stream."""
+        logger.info(f"[chat/stream] question: {req.message[:100]}")
+        started = time.perf_counter()
+        timings = {} if req.timings else None
+        current_timings.set(timings)
+        if not COALESCE_ENABLED:
+                return StreamingResponse(respond_stream(stream_chat(req, started), started, timings), media_type="application/x-ndjson")
+
+        key = coalesce_key(req)
+        shared = _inflight_streams.get(key)
+        joined = shared is not None
+        if shared is None:
+                def release():
+                        if _inflight_streams.get(key) is shared:
+                                del _inflight_streams[key]
+                shared = SharedStream(stream_chat(req, started), release)
+                _inflight_streams[key] = shared
+        else:
+                COALESCED.inc(endpoint="chat_stream")
+                logger.info("[chat/stream] joined in-flight stream")
+        return StreamingResponse(respond_stream(shared.subscribe(), started, timings, joined), media_type="application/x-ndjson")
+
+def lexical_results(question: str, k: int) -> Optional[list]:
+        if lexical_index is None:
+                return None
+        return [
+                {
+                        "score": round(score, 4),
+                        "source": doc.metadata.get("source", "unknown"),
+                        "content_preview": doc.page_content[:500],
+                        "content_length": len(doc.page_content),
+                }
+                for doc, score in lexical_index.search(question, k=k)
+        ]
+
+def debug_search(req: RetrieveRequest, expanded: str, query_vec: List[float]) -> Dict[str, Any]:
         try:
-                scored_hits = db.similarity_search_with_relevance_scores(expanded, k=req.k)
+                scored_hits = scored_search(query_vec, req.k)
                 results = []
                 for doc, score in scored_hits:
                         results.append({
                                 "score": round(score, 4),
                                 "source": doc.metadata.get("source", "unknown"),
+                                "product": doc.metadata.get("product"),
                                 "content_preview": doc.page_content[:500],
                                 "content_length": len(doc.page_content),
                         })
                 return {
                         "query": req.message,
                         "expanded_query": expanded,
+                        "route": route_products(req.message),
                         "total_results": len(results),
                         "threshold": RELEVANCE_THRESHOLD,
+                        "embedding_cache": embedding_cache.stats(),
+                        "vector_index": vector_index.stats() if vector_index is not None else None,
                         "results": results,
+                        "lexical_results": lexical_results(req.message, req.k),
                 }
         except Exception as e:
-                hits = db.similarity_search(expanded, k=req.k)
+                hits = get_db().similarity_search_by_vector(query_vec, k=req.k)
                 results = []
                 for doc in hits:
                         results.append({
@@ -239,9 +1014,49 @@ def debug_retrieve(req: RetrieveRequest):
                         "expanded_query": expanded,
                         "total_results": len(results),
                         "note": f"Scored search unavailable ({e}), used basic search",
+                        "embedding_cache": embedding_cache.stats(),
                         "results": results,
                 }
 
+@app.post("/debug/retrieve")
+async def debug_retrieve(req: RetrieveRequest):
+        expanded = expand_query(req.message)
+        logger.info(f"[debug] query: {expanded[:150]}")
+        query_vec = await embedding_cache.aget(expanded)
+        return await run_in_threadpool(debug_search, req, expanded, query_vec)
+
+@app.get("/debug/cache")
+def debug_cache():
+        return {
+                "embedding_cache": embedding_cache.stats(),
+                "page_index": page_index_cache.stats(),
+                "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+        }
+
+@app.delete("/debug/cache")
+def clear_cache():
+        if answer_cache is not None:
+                answer_cache.clear()
+        return debug_cache()
+
+@app.get("/metrics")
+def metrics_endpoint():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/healthz")
 def health():
-        return {"ok": True}
+        models = {d["model"]: d for d in readiness.values() if "model" in d}
+        return {
+                "ok": True,
+                "models_ready": all(d["state"] in ("ready", "disabled") for d in models.values()),
+                "models": models,
+        }
+
+@app.get("/readyz")
+def ready():
+        ok = all(
+                d["state"] in ("ready", "disabled") or (name in OPTIONAL_DEPENDENCIES and d["state"] == "failed")
+                for name, d in readiness.items()
+        )
+        body = {"ready": ok, "dependencies": readiness}
+        return JSONResponse(body, status_code=200 if ok else 503)
@@ -0,0 +1,169 @@
+# context_packer.py
+import re
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+PIECE_RE = re.compile(r"\w+|[^\w\s]")
+PARAGRAPH_RE = re.compile(r"\n\s*\n")
+SPACE_RE = re.compile(r"\s+")
+# Shortest overlap accepted when chunks carry no start_index (stores ingested
+# before offsets were recorded) and have to be stitched by text.
+MIN_TEXT_OVERLAP = 50
+# Chunks whose offsets are at most this far apart count as adjacent.
+MAX_GAP = 3
+# Paragraphs shorter than this are too generic ("Example", "Response") to dedupe.
+MIN_DEDUPE_CHARS = 40
+
+def estimate_tokens(text: str) -> int:
+        """
+        Cheap llama-style token estimate: one token per word or punctuation
+        mark, plus one per further 8 characters of long identifiers.
+        """
+        return sum(1 + len(p) // 8 for p in PIECE_RE.findall(text))
+
+class Passage:
+        """One or more merged chunks of the same source page."""
+
+        def __init__(self, doc: Document, rank: int):
+                self.source = doc.metadata.get("source", "unknown")
+                self.text = doc.page_content.strip()
+                start = doc.metadata.get("start_index")
+                self.start: Optional[int] = int(start) if start is not None else None
+                self.rank = rank
+                self.relevance = 1.0 / (rank + 1)
+
+        @property
+        def end(self) -> Optional[int]:
+                return None if self.start is None else self.start + len(self.text)
+
+        def absorb(self, other: "Passage") -> bool:
+                """Merge `other` into this passage if the two overlap or touch."""
+                joined = None
+                if self.start is not None and other.start is not None:
+                        first, second = (self, other) if self.start <= other.start else (other, self)
+                        if second.start > first.end + MAX_GAP:
+                                return False
+                        if second.start >= first.end:
+                                # Neighbours split on a separator the splitter stripped.
+                                joined = first.text + "\n" + second.text, first.start
+                        else:
+                                # Offsets of chunks that incremental ingest skipped can be
+                                # stale, so only cut where the texts really overlap.
+                                shared = first.text[second.start - first.start:second.start - first.start + len(second.text)]
+                                if second.text.startswith(shared):
+                                        joined = first.text + second.text[len(shared):], first.start
+                if joined is None:
+                        text = stitch(self.text, other.text) or stitch(other.text, self.text)
+                        if text is None:
+                                return False
+                        joined = text, None
+                text, start = joined
+                self.text, self.start = text, start
+                self.rank = min(self.rank, other.rank)
+                self.relevance += other.relevance
+                return True
+
+def stitch(a: str, b: str) -> Optional[str]:
+        """a + b without their shared overlap, if b starts inside a."""
+        if b in a:
+                return a
+        head = b[:MIN_TEXT_OVERLAP]
+        if len(head) < MIN_TEXT_OVERLAP:
+                return None
+        idx = a.find(head)
+        while idx != -1:
+                if b.startswith(a[idx:]):
+                        return a + b[len(a) - idx:]
+                idx = a.find(head, idx + 1)
+        return None
+
+def merge_passages(contexts: List[Document]) -> List[Passage]:
+        merged: List[Passage] = []
+        for rank, doc in enumerate(contexts):
+                passage = Passage(doc, rank)
+                if not passage.text:
+                        continue
+                # Absorbing can make a passage overlap an earlier one, so keep
+                # folding until nothing else joins.
+                while True:
+                        target = next((m for m in merged if m.source == passage.source and m.absorb(passage)), None)
+                        if target is None:
+                                merged.append(passage)
+                                break
+                        merged.remove(target)
+                        passage = target
+        return merged
+
+def dedupe_paragraphs(text: str, seen: set) -> List[str]:
+        kept = []
+        for para in PARAGRAPH_RE.split(text):
+                para = para.strip()
+                if not para:
+                        continue
+                key = SPACE_RE.sub(" ", para).lower()
+                if len(key) >= MIN_DEDUPE_CHARS:
+                        if key in seen:
+                                continue
+                        seen.add(key)
+                kept.append(para)
+        return kept
+
+def trim_to_tokens(paragraphs: List[str], budget: int) -> Tuple[str, int]:
+        """Whole paragraphs up to `budget`; the first one is cut at a sentence if needed."""
+        out, used = [], 0
+        for para in paragraphs:
+                cost = estimate_tokens(para)
+                if used + cost <= budget:
+                        out.append(para)
+                        used += cost
+                        continue
+                if not out:
+                        sentences = re.split(r"(?<=[.!?\n])\s+", para)
+                        part = []
+                        for s in sentences:
+                                c = estimate_tokens(s)
+                                if used + c > budget:
+                                        break
+                                part.append(s)
+                                used += c
+                        if part:
+                                out.append(" ".join(part))
+                break
+        return "\n\n".join(out), used
+
+def pack_context(contexts: List[Document], budget_tokens: int) -> Tuple[List[Tuple[str, str]], int]:
+        """
+        Turns ranked retrieval hits into [(source, text)] blocks for the prompt.
+
+        Overlapping chunks of a page are merged (by start_index, or by text for
+        chunks stored without offsets), paragraphs already used elsewhere are
+        dropped, and passages are chosen by relevance per token until the
+        budget is spent. Chosen blocks keep their retrieval order.
+        """
+        passages = merge_passages(contexts)
+        seen: set = set()
+        candidates = []
+        for p in sorted(passages, key=lambda p: p.rank):
+                paragraphs = dedupe_paragraphs(p.text, seen)
+                if paragraphs:
+                        text = "\n\n".join(paragraphs)
+                        candidates.append((p, paragraphs, estimate_tokens(text)))
+
+        chosen, used = [], 0
+        for p, paragraphs, cost in sorted(candidates, key=lambda c: c[0].relevance / max(c[2], 1), reverse=True):
+                remaining = budget_tokens - used
+                if remaining <= 0:
+                        break
+                if cost <= remaining:
+                        chosen.append((p, "\n\n".join(paragraphs)))
+                        used += cost
+                else:
+                        # Keep the leading paragraphs that fit rather than cutting mid-text.
+                        text, cost = trim_to_tokens(paragraphs, remaining)
+                        if text:
+                                chosen.append((p, text))
+                                used += cost
+
+        chosen.sort(key=lambda c: c[0].rank)
+        return [(p.source, text) for p, text in chosen], used
@@ -0,0 +1,149 @@
+# lexical.py
+import os
+import re
+import json
+import math
+import shutil
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+TOKEN_RE = re.compile(r"[A-Za-z0-9_]+")
+CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+STOPWORDS = frozenset(
+        "a an and are as at be by can do does for from how i in is it me my of on or "
+        "the this to what when where which who why will with you your".split()
+)
+
+def tokenize(text: str) -> List[str]:
+        # Used for both the indexed chunks and the queries, so they can't drift apart.
+        tokens = []
+        for raw in TOKEN_RE.findall(text):
+                low = raw.lower()
+                if low in STOPWORDS:
+                        continue
+                tokens.append(low)
+                parts = [p.lower() for piece in raw.split("_") for p in CAMEL_RE.findall(piece)]
+                if len(parts) > 1:
+                        tokens.extend(p for p in parts if len(p) > 1 and p not in STOPWORDS)
+        return tokens
+
+def index_version(path: str) -> Optional[str]:
+        """Build version from meta.json, or None for indexes written before it existed."""
+        try:
+                with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+                        return json.load(f).get("version")
+        except (OSError, ValueError):
+                return None
+
+def write_postings(out_dir: str, documents: List[Optional[str]]) -> None:
+        """
+        Write a BM25 inverted index over `documents` into `out_dir`.
+
+        Postings are stored term-major as flat .npy arrays so they can be
+        memory-mapped: term_offsets[t]:term_offsets[t+1] slices doc_ids/tfs.
+        """
+        vocab: Dict[str, int] = {}
+        postings: List[List[Tuple[int, int]]] = []
+        doc_len = np.zeros(len(documents), dtype=np.float32)
+        for d, text in enumerate(documents):
+                tf = Counter(tokenize(text or ""))
+                doc_len[d] = sum(tf.values())
+                for term, n in tf.items():
+                        t = vocab.setdefault(term, len(vocab))
+                        if t == len(postings):
+                                postings.append([])
+                        postings[t].append((d, n))
+
+        offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(p) for p in postings])
+        doc_ids = np.fromiter((d for p in postings for d, _ in p), dtype=np.int32, count=int(offsets[-1]))
+        tfs = np.fromiter((n for p in postings for _, n in p), dtype=np.float32, count=int(offsets[-1]))
+
+        os.makedirs(out_dir)
+        np.save(os.path.join(out_dir, "term_offsets.npy"), offsets)
+        np.save(os.path.join(out_dir, "doc_ids.npy"), doc_ids)
+        np.save(os.path.join(out_dir, "tfs.npy"), tfs)
+        np.save(os.path.join(out_dir, "doc_len.npy"), doc_len)
+        with open(os.path.join(out_dir, "vocab.json"), "w", encoding="utf-8") as f:
+                json.dump(vocab, f)
+
+def ensure_postings(path: str, version: Optional[str], documents: List[Optional[str]]) -> str:
+        """
+        Directory with the postings of this published version, built on first use.
+
+        Ingest only publishes the chunk texts; the first worker to load a
+        version tokenizes them and the others reuse its files. A new version
+        is published as a new directory, so stale postings go with the old one.
+        """
+        out_dir = os.path.join(path, f"postings-{version or 'unversioned'}")
+        if os.path.isdir(out_dir):
+                return out_dir
+        tmp_dir = f"{out_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        write_postings(tmp_dir, documents)
+        try:
+                os.rename(tmp_dir, out_dir)
+        except OSError:
+                # Another worker published the same postings first.
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                if not os.path.isdir(out_dir):
+                        raise
+        return out_dir
+
+class LexicalIndex:
+        """
+        BM25 over the chunk texts that ingest.build_bm25_index() publishes.
+
+        Posting arrays are memory-mapped, so several workers share one copy of
+        them through the page cache.
+        """
+
+        def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+                self.path = path
+                self.version = index_version(path)
+                self.k1 = k1
+                self.b = b
+                with open(os.path.join(path, "chunks.json"), encoding="utf-8") as f:
+                        chunks = json.load(f)
+                self.ids = chunks["ids"]
+                self.docs = [
+                        Document(page_content=text or "", metadata=meta or {})
+                        for text, meta in zip(chunks["documents"], chunks["metadatas"])
+                ]
+                postings = ensure_postings(path, self.version, chunks["documents"])
+                self.offsets = np.load(os.path.join(postings, "term_offsets.npy"), mmap_mode="r")
+                self.doc_ids = np.load(os.path.join(postings, "doc_ids.npy"), mmap_mode="r")
+                self.tfs = np.load(os.path.join(postings, "tfs.npy"), mmap_mode="r")
+                doc_len = np.load(os.path.join(postings, "doc_len.npy"))
+                with open(os.path.join(postings, "vocab.json"), encoding="utf-8") as f:
+                        self.vocab = json.load(f)
+                self.n_docs = len(self.docs)
+                avgdl = float(doc_len.mean()) if self.n_docs else 1.0
+                # Precompute the length-normalisation term of the BM25 denominator.
+                self.norm = (self.k1 * (1 - self.b + self.b * doc_len / (avgdl or 1.0))).astype(np.float32)
+
+        def __len__(self) -> int:
+                return self.n_docs
+
+        def search(self, query: str, k: int = 8) -> List[Tuple[Document, float]]:
+                if not self.n_docs:
+                        return []
+                scores = np.zeros(self.n_docs, dtype=np.float32)
+                for term in set(tokenize(query)):
+                        t = self.vocab.get(term)
+                        if t is None:
+                                continue
+                        start, end = int(self.offsets[t]), int(self.offsets[t + 1])
+                        docs = self.doc_ids[start:end]
+                        tf = self.tfs[start:end]
+                        df = end - start
+                        idf = math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+                        scores[docs] += idf * tf * (self.k1 + 1) / (tf + self.norm[docs])
+
+                k = min(k, self.n_docs)
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+                return [(self.docs[i], float(scores[i])) for i in top if scores[i] > 0]
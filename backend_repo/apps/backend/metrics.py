@@ -0,0 +1,115 @@
+# metrics.py
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Minimal Prometheus text-format metrics, per worker process.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _fmt_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(labels) + ([extra] if extra else [])
+        if not pairs:
+                return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+class Counter:
+        def __init__(self, name: str, help: str):
+                self.name = name
+                self.help = help
+                self._values: Dict[Labels, float] = {}
+                self._lock = threading.Lock()
+
+        def inc(self, amount: float = 1.0, **labels: str) -> None:
+                key = tuple(sorted(labels.items()))
+                with self._lock:
+                        self._values[key] = self._values.get(key, 0.0) + amount
+
+        def render(self) -> List[str]:
+                lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+                with self._lock:
+                        for labels, value in sorted(self._values.items()):
+                                lines.append(f"{self.name}{_fmt_labels(labels)} {value}")
+                return lines
+
+class Histogram:
+        def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+                self.name = name
+                self.help = help
+                self.buckets = buckets
+                self._values: Dict[Labels, List[float]] = {}
+                self._lock = threading.Lock()
+
+        def observe(self, value: float, **labels: str) -> None:
+                key = tuple(sorted(labels.items()))
+                with self._lock:
+                        # Per label set: one count per bucket, then +Inf count and sum.
+                        state = self._values.setdefault(key, [0.0] * (len(self.buckets) + 2))
+                        state[bisect.bisect_left(self.buckets, value)] += 1
+                        state[-1] += value
+
+        def render(self) -> List[str]:
+                lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+                with self._lock:
+                        for labels, state in sorted(self._values.items()):
+                                cumulative = 0.0
+                                for bound, n in zip(self.buckets, state):
+                                        cumulative += n
+                                        lines.append(f"{self.name}_bucket{_fmt_labels(labels, ('le', str(bound)))} {cumulative}")
+                                cumulative += state[len(self.buckets)]
+                                lines.append(f"{self.name}_bucket{_fmt_labels(labels, ('le', '+Inf'))} {cumulative}")
+                                lines.append(f"{self.name}_count{_fmt_labels(labels)} {cumulative}")
+                                lines.append(f"{self.name}_sum{_fmt_labels(labels)} {state[-1]}")
+                return lines
+
+class Gauge:
+        """Value read from a callback at scrape time."""
+
+        def __init__(self, name: str, help: str, fn: Callable[[], Dict[Labels, float]]):
+                self.name = name
+                self.help = help
+                self.fn = fn
+
+        def render(self) -> List[str]:
+                lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+                for labels, value in sorted(self.fn().items()):
+                        lines.append(f"{self.name}{_fmt_labels(labels)} {value}")
+                return lines
+
+REGISTRY: list = []
+
+def register(metric):
+        REGISTRY.append(metric)
+        return metric
+
+def render() -> str:
+        lines: List[str] = []
+        for metric in REGISTRY:
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+STAGE_SECONDS = register(Histogram("rag_stage_seconds", "Time spent in each /chat pipeline stage."))
+
+# Per-request stage timings in ms, when the caller asked for them. The dict is
+# shared by reference, so threadpool hops (which copy the context) still write
+# into the same object.
+current_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("current_timings", default=None)
+
+def record_stage(name: str, seconds: float) -> None:
+        STAGE_SECONDS.observe(seconds, stage=name)
+        timings = current_timings.get()
+        if timings is not None:
+                timings[name] = round(timings.get(name, 0.0) + seconds * 1000, 2)
+
+@contextmanager
+def stage(name: str):
+        started = time.perf_counter()
+        try:
+                yield
+        finally:
+                record_stage(name, time.perf_counter() - started)
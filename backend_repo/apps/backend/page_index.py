@@ -0,0 +1,197 @@
+# page_index.py
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Awaitable, Callable, Optional, Tuple
+
+import numpy as np
+
+from context_packer import estimate_tokens
+
+# Lines shorter than this are menu/button labels ("Go", "×"), not content.
+MIN_LINE_LENGTH = 3
+# A sequence of at least MIN_REPEATED_RUN consecutive lines under
+# SHORT_LINE_CHARS that already appeared verbatim is a repeated menu or link list.
+SHORT_LINE_CHARS = 40
+MIN_REPEATED_RUN = 5
+
+EmbedFn = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+def page_digest(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def split_long_line(line: str, chunk_chars: int) -> List[str]:
+        pieces, current = [], ""
+        for word in line.split(" "):
+                if current and len(current) + 1 + len(word) > chunk_chars:
+                        pieces.append(current)
+                        current = word
+                else:
+                        current = f"{current} {word}" if current else word
+        if current:
+                pieces.append(current)
+        return pieces
+
+def drop_repeated_runs(lines: List[str]) -> List[str]:
+        """
+        Drops sequences of short lines that repeat an earlier sequence exactly
+        (the same menu in header, sidebar and footer). Single repeated lines
+        such as "Required" or "type string" in API reference tables are kept.
+        """
+        n = MIN_REPEATED_RUN
+        short = [len(line) < SHORT_LINE_CHARS for line in lines]
+        seen = set()
+        kept: List[str] = []
+        i = 0
+        while i < len(lines):
+                window = tuple(lines[i:i + n])
+                if len(window) == n and all(short[i:i + n]) and window in seen:
+                        # Skip for as long as the repeat continues.
+                        i += n
+                        while i < len(lines) and short[i] and tuple(lines[i - n + 1:i + 1]) in seen:
+                                i += 1
+                        continue
+                kept.append(lines[i])
+                if i + 1 >= n and all(short[i - n + 1:i + 1]):
+                        seen.add(tuple(lines[i - n + 1:i + 1]))
+                i += 1
+        return kept
+
+def chunk_page(text: str, chunk_chars: int) -> List[str]:
+        """
+        Packs the page's lines into chunks of at most `chunk_chars`, leaving out
+        very short lines and repeated menus (see drop_repeated_runs).
+        """
+        lines = []
+        for raw in text.replace("\r", "").replace("\t", " ").split("\n"):
+                line = " ".join(raw.split())
+                if len(line) >= MIN_LINE_LENGTH:
+                        lines.append(line)
+        chunks, current = [], []
+        size = 0
+        for line in drop_repeated_runs(lines):
+                for piece in split_long_line(line, chunk_chars) if len(line) > chunk_chars else [line]:
+                        if current and size + 1 + len(piece) > chunk_chars:
+                                chunks.append("\n".join(current))
+                                current, size = [], 0
+                        current.append(piece)
+                        size += len(piece) + (1 if size else 0)
+        if current:
+                chunks.append("\n".join(current))
+        return chunks
+
+class PageIndex:
+        """Chunks of one version of one page, with unit-length embeddings."""
+
+        def __init__(self, url: str, digest: str, chunks: List[str], vectors: Optional[List[List[float]]]):
+                self.url = url
+                self.digest = digest
+                self.chunks = chunks
+                self.tokens = [estimate_tokens(c) for c in chunks]
+                self.matrix: Optional[np.ndarray] = None
+                if vectors is not None:
+                        m = np.asarray(vectors, dtype=np.float32)
+                        self.matrix = m / (np.linalg.norm(m, axis=1, keepdims=True) + 1e-12)
+
+        def passages(self, query_vec: List[float], budget_tokens: int) -> List[str]:
+                """
+                The chunks most similar to the question that fit in `budget_tokens`,
+                in page order. A page that was small enough to skip embedding is
+                returned whole.
+                """
+                if self.matrix is None:
+                        return list(self.chunks)
+                q = np.asarray(query_vec, dtype=np.float32)
+                scores = self.matrix @ (q / (np.linalg.norm(q) + 1e-12))
+                chosen, used = [], 0
+                for i in np.argsort(-scores):
+                        if used + self.tokens[i] <= budget_tokens:
+                                chosen.append(int(i))
+                                used += self.tokens[i]
+                        elif not chosen:
+                                # Even the best chunk is over budget: keep its head.
+                                words = self.chunks[i].split(" ")
+                                keep = max(1, len(words) * budget_tokens // max(self.tokens[i], 1))
+                                return [" ".join(words[:keep])]
+                return [self.chunks[i] for i in sorted(chosen)]
+
+class PageIndexCache:
+        """
+        Bounded LRU of per-page mini-indexes keyed by (page_url, content hash).
+
+        A page is chunked and embedded the first time it is seen; follow-up
+        questions on the same page reuse the index, and concurrent requests for
+        a page that is still being embedded wait for that one build. Pages
+        whose text fits in `whole_tokens` are kept as-is without embedding.
+        """
+
+        def __init__(self, embed: EmbedFn, maxsize: int = 64, chunk_chars: int = 800,
+                     max_chars: int = 100000, whole_tokens: int = 500):
+                self.embed = embed
+                self.maxsize = maxsize
+                self.chunk_chars = chunk_chars
+                self.max_chars = max_chars
+                self.whole_tokens = whole_tokens
+                self.hits = 0
+                self.misses = 0
+                self.embedded_chunks = 0
+                self._data: "OrderedDict[Tuple[str, str], PageIndex]" = OrderedDict()
+                # Builds in progress; only touched from the event loop.
+                self._building: Dict[Tuple[str, str], "asyncio.Task"] = {}
+                self._lock = threading.Lock()
+
+        def _lookup(self, key: Tuple[str, str]) -> Optional[PageIndex]:
+                with self._lock:
+                        index = self._data.get(key)
+                        if index is not None:
+                                self._data.move_to_end(key)
+                                self.hits += 1
+                        return index
+
+        def _store(self, key: Tuple[str, str], index: PageIndex) -> None:
+                if self.maxsize <= 0:
+                        return
+                with self._lock:
+                        self._data[key] = index
+                        self._data.move_to_end(key)
+                        while len(self._data) > self.maxsize:
+                                self._data.popitem(last=False)
+
+        async def _build(self, url: str, digest: str, text: str) -> PageIndex:
+                chunks = chunk_page(text[:self.max_chars], self.chunk_chars)
+                vectors = None
+                if sum(estimate_tokens(c) for c in chunks) > self.whole_tokens:
+                        vectors = await self.embed(chunks)
+                        self.embedded_chunks += len(chunks)
+                return PageIndex(url, digest, chunks, vectors)
+
+        async def get(self, url: str, text: str) -> PageIndex:
+                key = (url, page_digest(text))
+                index = self._lookup(key)
+                if index is not None:
+                        return index
+                task = self._building.get(key)
+                if task is None:
+                        with self._lock:
+                                self.misses += 1
+                        task = asyncio.create_task(self._build(url, key[1], text))
+                        self._building[key] = task
+                        task.add_done_callback(lambda t: self._building.pop(key, None) if self._building.get(key) is t else None)
+                else:
+                        with self._lock:
+                                self.hits += 1
+                index = await asyncio.shield(task)
+                self._store(key, index)
+                return index
+
+        def stats(self) -> Dict[str, Any]:
+                with self._lock:
+                        return {
+                                "size": len(self._data),
+                                "maxsize": self.maxsize,
+                                "hits": self.hits,
+                                "misses": self.misses,
+                                "chunks": sum(len(i.chunks) for i in self._data.values()),
+                                "embedded_chunks": self.embedded_chunks,
+                        }
@@ -0,0 +1,52 @@
+# query_expansion.py
+"""
+Keyword expansion applied to questions before they are embedded. Kept free of
+side effects so tools such as query.py can import it without the backend.
+"""
+import re
+import logging
+
+logger = logging.getLogger("rag")
+
+QUERY_EXPANSION_MAP = {
+        r"\bship\b": "Ship API createShipment shipment",
+        r"\bshipping\b": "Ship API createShipment shipment",
+        r"\bground\b": "FEDEX_GROUND serviceType ground shipping",
+        r"\bexpress\b": "FEDEX_EXPRESS serviceType express",
+        r"\bovernight\b": "STANDARD_OVERNIGHT PRIORITY_OVERNIGHT serviceType",
+        r"\b2\s*day\b": "FEDEX_2_DAY serviceType",
+        r"\btrack\b": "Track API tracking trackByTrackingNumber",
+        r"\btracking\b": "Track API tracking trackByTrackingNumber",
+        r"\brate\b": "Rate API getRates rateRequest",
+        r"\brates\b": "Rate API getRates rateRequest",
+        r"\bquote\b": "Rate API getRates rateRequest quote",
+        r"\blabel\b": "Ship API label createShipment labelSpecification",
+        r"\bauth\b": "OAuth authentication client_credentials token",
+        r"\boauth\b": "OAuth authentication client_credentials token",
+        r"\baddress\b": "Address Validation API validateAddress",
+        r"\bvalidat\w*\b": "Address Validation API validateAddress",
+        r"\bwebhook\b": "Shipment Visibility Webhook notification",
+        r"\bpickup\b": "pickup schedulePickup CONTACT_FEDEX_TO_SCHEDULE",
+        r"\bweight\b": "weight units LB KG packageWeight",
+        r"\bdimension\b": "dimensions length width height IN CM",
+        r"\bpackage\b": "packageLineItems packageCount YOUR_PACKAGING",
+        r"\brecipient\b": "recipient recipientAddress contact",
+        r"\bshipper\b": "shipper shipperAddress contact accountNumber",
+        r"\baccount\b": "accountNumber shippingChargesPayment",
+        r"\brequired\b": "required mandatory fields parameters",
+        r"\bparameter\b": "parameters request body fields schema",
+        r"\bendpoint\b": "endpoint URL POST request path",
+}
+
+def expand_query(question: str) -> str:
+        lower_q = question.lower()
+        expansions = []
+        for pattern, terms in QUERY_EXPANSION_MAP.items():
+                if re.search(pattern, lower_q):
+                        expansions.append(terms)
+        if expansions:
+                expanded = question + " " + " ".join(expansions)
+                logger.info(f"[expand] original: {question}")
+                logger.info(f"[expand] expanded: {expanded[:200]}...")
+                return expanded
+        return question
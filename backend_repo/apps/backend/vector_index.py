@@ -0,0 +1,234 @@
+# vector_index.py
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger("rag")
+
+DTYPES = ("float32", "float16", "int8")
+
+def store_version(db) -> str:
+        """
+        Identifies the store contents: chunk IDs are content hashes, so a hash
+        of the sorted IDs plus the newest ingest timestamp changes on any ingest.
+        """
+        data = db.get(include=["metadatas"])
+        latest = max(((m or {}).get("ingested_at") or "" for m in data["metadatas"]), default="")
+        h = hashlib.sha1(latest.encode("utf-8"))
+        for chunk_id in sorted(data["ids"]):
+                h.update(chunk_id.encode("utf-8"))
+        return h.hexdigest()[:16]
+
+class Snapshot:
+        """One immutable, memory-mapped export of the store."""
+
+        def __init__(self, path: str):
+                self.path = path
+                with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+                        self.meta = json.load(f)
+                self.matrix = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+                self.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r")
+                self.sq_norms = np.load(os.path.join(path, "sq_norms.npy"), mmap_mode="r")
+                with open(os.path.join(path, "chunks.json"), encoding="utf-8") as f:
+                        chunks = json.load(f)
+                self.docs = [
+                        Document(page_content=text or "", metadata=meta or {})
+                        for text, meta in zip(chunks["documents"], chunks["metadatas"])
+                ]
+                self._columns: Dict[str, np.ndarray] = {}
+
+        def __len__(self) -> int:
+                return len(self.docs)
+
+        def dot(self, q: np.ndarray) -> np.ndarray:
+                scores = self.matrix @ q
+                if self.meta["dtype"] == "int8":
+                        scores = scores * self.scales
+                return scores.astype(np.float32, copy=False)
+
+        def mask(self, where: Dict[str, Any]) -> np.ndarray:
+                """Rows matching a Chroma-style filter: {"field": value} or {"field": {"$in": [...]}}."""
+                keep = np.ones(len(self.docs), dtype=bool)
+                for field, cond in where.items():
+                        column = self._columns.get(field)
+                        if column is None:
+                                column = np.array([d.metadata.get(field) for d in self.docs], dtype=object)
+                                self._columns[field] = column
+                        allowed = cond["$in"] if isinstance(cond, dict) else [cond]
+                        keep &= np.isin(column, allowed)
+                return keep
+
+        def rows(self, idx: np.ndarray) -> np.ndarray:
+                m = np.asarray(self.matrix[idx], dtype=np.float32)
+                if self.meta["dtype"] == "int8":
+                        m = m * self.scales[idx][:, None]
+                return m
+
+def export_snapshot(db, path: str, version: str, dtype: str) -> None:
+        data = db._collection.get(include=["embeddings", "documents", "metadatas"])
+        vectors = np.asarray(data["embeddings"], dtype=np.float32)
+        if vectors.ndim != 2:
+                vectors = vectors.reshape(0, 0)
+        sq_norms = (vectors ** 2).sum(axis=1).astype(np.float32)
+        scales = np.ones(len(vectors), dtype=np.float32)
+        if dtype == "float16":
+                stored = vectors.astype(np.float16)
+        elif dtype == "int8":
+                # Symmetric per-row quantisation: row ~= int8 * scale.
+                scales = (np.abs(vectors).max(axis=1) / 127.0).astype(np.float32) if len(vectors) else scales
+                scales[scales == 0] = 1.0
+                stored = np.round(vectors / scales[:, None]).astype(np.int8)
+        else:
+                stored = vectors
+
+        tmp = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, "vectors.npy"), np.ascontiguousarray(stored))
+        np.save(os.path.join(tmp, "scales.npy"), scales)
+        np.save(os.path.join(tmp, "sq_norms.npy"), sq_norms)
+        with open(os.path.join(tmp, "chunks.json"), "w", encoding="utf-8") as f:
+                json.dump({"ids": data["ids"], "documents": data["documents"], "metadatas": data["metadatas"]}, f)
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({
+                        "version": version,
+                        "dtype": dtype,
+                        "count": int(vectors.shape[0]),
+                        "dim": int(vectors.shape[1]) if vectors.ndim == 2 and len(vectors) else 0,
+                        "space": (db._collection.metadata or {}).get("hnsw:space", "l2"),
+                }, f)
+        try:
+                os.rename(tmp, path)
+        except OSError:
+                # Another worker published the same version first; use theirs.
+                shutil.rmtree(tmp, ignore_errors=True)
+
+def preload(snap: Snapshot) -> None:
+        """Read every mapped page once so first queries don't fault them in."""
+        if len(snap):
+                for arr in (snap.matrix, snap.scales, snap.sq_norms):
+                        np.add.reduce(arr, axis=0, dtype=np.float64)
+
+class VectorIndex:
+        """
+        Exact in-memory search over a float32/float16/int8 snapshot of the store.
+
+        Snapshots live in `root/<version>-<dtype>/` and are shared read-only (mmap) by
+        every worker. refresh() re-checks the store version and exports and
+        swaps in a new snapshot; the caller runs it off the request path, so
+        searches only ever read the current snapshot. With `preload`, a new
+        snapshot's pages are read in before it is swapped in.
+        """
+
+        def __init__(self, db, root: str, dtype: str = "float32", preload: bool = False):
+                if dtype not in DTYPES:
+                        raise ValueError(f"VECTOR_INDEX_DTYPE must be one of {DTYPES}, got {dtype!r}")
+                self.db = db
+                self.root = root
+                self.dtype = dtype
+                self.preload = preload
+                self.snapshot: Optional[Snapshot] = None
+                self._lock = threading.Lock()
+                self.refresh()
+
+        def refresh(self) -> None:
+                with self._lock:
+                        version = store_version(self.db)
+                        if self.snapshot is not None and self.snapshot.meta["version"] == version:
+                                return
+                        path = os.path.join(self.root, f"{version}-{self.dtype}")
+                        if not os.path.isdir(path):
+                                started = time.perf_counter()
+                                os.makedirs(self.root, exist_ok=True)
+                                export_snapshot(self.db, path, version, self.dtype)
+                                logger.info(f"[vector-index] exported {path} in {time.perf_counter() - started:.2f}s")
+                        snapshot = Snapshot(path)
+                        if self.preload:
+                                preload(snapshot)
+                        self.snapshot = snapshot
+                        logger.info(f"[vector-index] loaded {len(self.snapshot)} vectors ({self.dtype}) version {version}")
+                        self._prune(keep=path)
+
+        def _prune(self, keep: str) -> None:
+                for name in os.listdir(self.root):
+                        full = os.path.join(self.root, name)
+                        if full != keep and os.path.isdir(full) and ".tmp-" not in name:
+                                # Other workers may still map the old files; unlinking is safe on POSIX.
+                                shutil.rmtree(full, ignore_errors=True)
+
+        def _distances(self, snap: Snapshot, q: np.ndarray) -> np.ndarray:
+                # Same distance Chroma would report for the collection's space, so
+                # the store's relevance function and thresholds still apply.
+                space = snap.meta["space"]
+                dots = snap.dot(q)
+                if space == "cosine":
+                        return 1.0 - dots / (np.sqrt(snap.sq_norms) * float(np.linalg.norm(q)) + 1e-12)
+                if space == "ip":
+                        return 1.0 - dots
+                return snap.sq_norms + float(q @ q) - 2.0 * dots
+
+        def _top(self, query_vec: List[float], k: int, where: Optional[Dict[str, Any]] = None) -> Tuple[Snapshot, np.ndarray, np.ndarray]:
+                snap = self.snapshot
+                q = np.asarray(query_vec, dtype=np.float32)
+                empty = (snap, np.array([], dtype=np.int64), np.array([], dtype=np.float32))
+                if snap is None or not len(snap):
+                        return empty
+                dist = self._distances(snap, q)
+                if where:
+                        keep = snap.mask(where)
+                        k = min(k, int(keep.sum()))
+                        if not k:
+                                return empty
+                        dist = np.where(keep, dist, np.inf)
+                k = min(k, len(dist))
+                top = np.argpartition(dist, k - 1)[:k]
+                top = top[np.argsort(dist[top])]
+                return snap, top, dist[top]
+
+        def similarity_search_with_distance(self, query_vec: List[float], k: int, where: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+                snap, top, dist = self._top(query_vec, k, where)
+                return [(snap.docs[i], float(d)) for i, d in zip(top, dist)]
+
+        def max_marginal_relevance_search(self, query_vec: List[float], k: int, fetch_k: int, lambda_mult: float = 0.5,
+                                          where: Optional[Dict[str, Any]] = None) -> List[Document]:
+                snap, top, _ = self._top(query_vec, fetch_k, where)
+                if not len(top) or k <= 0:
+                        return []
+                cand = snap.rows(top)
+                cand /= np.linalg.norm(cand, axis=1, keepdims=True) + 1e-12
+                q = np.asarray(query_vec, dtype=np.float32)
+                q = q / (np.linalg.norm(q) + 1e-12)
+                sim_q = cand @ q
+                sim_cc = cand @ cand.T
+
+                selected = [int(np.argmax(sim_q))]
+                redundancy = sim_cc[:, selected[0]].copy()
+                available = np.ones(len(top), dtype=bool)
+                available[selected[0]] = False
+                while len(selected) < min(k, len(top)):
+                        score = lambda_mult * sim_q - (1 - lambda_mult) * redundancy
+                        score[~available] = -np.inf
+                        nxt = int(np.argmax(score))
+                        selected.append(nxt)
+                        available[nxt] = False
+                        np.maximum(redundancy, sim_cc[:, nxt], out=redundancy)
+                # maximal_marginal_relevance returns picks in selection order, but
+                # Chroma's MMR search keeps the candidates it picked in their
+                # original order; do the same so both paths rank alike.
+                return [snap.docs[top[i]] for i in sorted(selected)]
+
+        def stats(self) -> Dict[str, Any]:
+                snap = self.snapshot
+                return {
+                        "path": snap.path if snap else None,
+                        "count": len(snap) if snap else 0,
+                        **({k: snap.meta[k] for k in ("version", "dtype", "dim", "space")} if snap else {}),
+                }
@@ -0,0 +1,186 @@
+# cleaner.py
+"""
+Single-pass boilerplate stripper on lxml, used by ingest.py.
+
+STRIP_SELECTORS is compiled once into a SelectorMatcher (tag set, class set,
+exact attribute values and one substring regex per attribute). clean_html()
+then walks the tree once: matching subtrees are skipped and the remaining text
+is filtered line by line. The output is the same as
+ingest.strip_boilerplate(), which runs every selector separately through
+BeautifulSoup. Everything here is picklable so it can run in worker processes.
+"""
+import re
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from lxml import etree
+
+STRIP_SELECTORS = [
+        "header", "nav", "footer", "aside",
+        "script", "style", "noscript", "iframe", "svg",
+        "[role='navigation']", "[role='banner']", "[role='contentinfo']",
+        ".breadcrumbs", ".cookie", ".banner", ".sidebar",
+        ".menu", ".nav", ".navbar", ".navigation",
+        ".sign-up", ".signup", ".login", ".log-in", ".signin", ".sign-in",
+        ".modal", ".overlay", ".popup",
+        ".header", ".footer", ".topbar", ".top-bar",
+        "form[action*='login']", "form[action*='signup']",
+        "[class*='menu']", "[class*='Menu']",
+        "[class*='nav-']", "[class*='Nav-']",
+        "[class*='cookie']", "[class*='Cookie']",
+        "[class*='sign-up']", "[class*='SignUp']",
+        "[class*='login']", "[class*='Login']",
+        "[class*='modal']", "[class*='Modal']",
+        "[class*='dropdown']", "[class*='Dropdown']",
+        "[id*='menu']", "[id*='nav']", "[id*='login']", "[id*='signup']",
+]
+
+JUNK_PATTERNS = re.compile(
+        r"^("
+        r"true|false|null|undefined"
+        r"|sign\s*up|log\s*in|log\s*out|sign\s*in|sign\s*out"
+        r"|sign\s*up\s+or\s+log\s*in"
+        r"|forgot\s*password.*"
+        r"|main\s*menu"
+        r"|menu"
+        r"|×|✕|close"
+        r"|home"
+        r"|get\s+access\s+to\s+fedex.*"
+        r"|united\s+states\s+engli.*"
+        r"|developer\s+portal\s*$"
+        r"|skip\s+to\s+.*"
+        r"|back\s+to\s+top"
+        r"|toggle\s+.*"
+        r"|expand\s+all|collapse\s+all"
+        r"|loading\.{0,3}"
+        r"|please\s+wait.*"
+        r"|copyright\s*©.*"
+        r"|all\s+rights\s+reserved.*"
+        r"|terms\s+(of\s+use|&\s+conditions).*"
+        r"|privacy\s+(policy|notice).*"
+        r"|cookie\s+(policy|preferences).*"
+        r")$",
+        re.I
+)
+
+MIN_LINE_LENGTH = 3
+
+# BeautifulSoup keeps text inside these tags as special string types that
+# get_text() leaves out; skip them too so output stays identical.
+HIDDEN_TEXT_TAGS = frozenset({"script", "style", "template", "rt", "rp"})
+
+SELECTOR_RE = re.compile(
+        r"^(?P<tag>[a-zA-Z][\w-]*)?"
+        r"(?:\.(?P<cls>[\w-]+)"
+        r"|\[(?P<attr>[\w-]+)(?P<op>\*?=)'(?P<value>[^']*)'\])?$"
+)
+
+class SelectorMatcher:
+        """
+        All of STRIP_SELECTORS as one predicate. Supports the selector forms
+        that list uses: `tag`, `.class`, `[attr='v']`, `[attr*='v']` and
+        `tag[attr*='v']`.
+        """
+
+        def __init__(self, selectors: List[str]):
+                self.tags: Set[str] = set()
+                self.classes: Set[str] = set()
+                self.exact: Dict[str, Set[str]] = {}
+                # attribute -> tag restriction (None = any tag) -> substrings
+                substrings: Dict[Tuple[str, Optional[str]], List[str]] = {}
+                for sel in selectors:
+                        m = SELECTOR_RE.match(sel.strip())
+                        if m is None or not any(m.groupdict().values()):
+                                raise ValueError(f"unsupported selector: {sel!r}")
+                        tag = m["tag"].lower() if m["tag"] else None
+                        if m["cls"]:
+                                if tag:
+                                        raise ValueError(f"unsupported selector: {sel!r}")
+                                self.classes.add(m["cls"])
+                        elif m["attr"] and m["op"] == "=":
+                                if tag:
+                                        raise ValueError(f"unsupported selector: {sel!r}")
+                                self.exact.setdefault(m["attr"].lower(), set()).add(m["value"])
+                        elif m["attr"]:
+                                substrings.setdefault((m["attr"].lower(), tag), []).append(m["value"])
+                        else:
+                                self.tags.add(tag)
+                self.substrings = [
+                        (attr, tag, re.compile("|".join(re.escape(v) for v in values)))
+                        for (attr, tag), values in substrings.items()
+                ]
+
+        def __call__(self, el) -> bool:
+                if el.tag in self.tags:
+                        return True
+                attrib = el.attrib
+                if not attrib:
+                        return False
+                cls = attrib.get("class")
+                if cls is not None and self.classes and not self.classes.isdisjoint(cls.split()):
+                        return True
+                for attr, values in self.exact.items():
+                        if attrib.get(attr) in values:
+                                return True
+                for attr, tag, pattern in self.substrings:
+                        value = attrib.get(attr)
+                        if value is None or (tag is not None and el.tag != tag):
+                                continue
+                        if attr == "class":
+                                # BeautifulSoup matches against the whitespace-normalised class list.
+                                value = " ".join(value.split())
+                        if pattern.search(value):
+                                return True
+                return False
+
+MATCHER = SelectorMatcher(STRIP_SELECTORS)
+
+def parse(html: Union[str, bytes]):
+        parser = etree.HTMLParser(recover=True, strip_cdata=False)
+        try:
+                return etree.fromstring(html, parser)
+        except ValueError:
+                # lxml refuses str input that carries an XML encoding declaration.
+                return etree.fromstring(html.encode("utf-8"), etree.HTMLParser(recover=True, strip_cdata=False, encoding="utf-8"))
+
+def iter_text(root, matcher: SelectorMatcher = MATCHER):
+        """Text nodes in document order, skipping stripped and hidden subtrees."""
+        # Stack entries are elements to enter, or plain strings (tails) to emit.
+        stack = [root]
+        while stack:
+                item = stack.pop()
+                if isinstance(item, str):
+                        yield item
+                        continue
+                el = item
+                if isinstance(el.tag, str):
+                        if matcher(el) or el.tag in HIDDEN_TEXT_TAGS:
+                                continue
+                        if el.text:
+                                yield el.text
+                        for child in reversed(el):
+                                if child.tail:
+                                        stack.append(child.tail)
+                                stack.append(child)
+
+def clean_html(html: Union[str, bytes]) -> str:
+        if not html:
+                return ""
+        try:
+                root = parse(html)
+        except etree.ParserError:
+                return ""
+        if root is None:
+                return ""
+        lines = []
+        for text in iter_text(root):
+                text = text.strip()
+                if not text:
+                        continue
+                for ln in text.splitlines():
+                        ln = ln.strip()
+                        if len(ln) < MIN_LINE_LENGTH:
+                                continue
+                        if JUNK_PATTERNS.match(ln):
+                                continue
+                        lines.append(ln)
+        return "\n".join(lines)
@@ -1,13 +1,22 @@
 # ingest.py
 import os
 import re
+import json
 import time
-from typing import Optional
+import queue
+import multiprocessing
+import shutil
+import hashlib
+import threading
+from typing import NamedTuple, Optional, Union
 from datetime import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from urllib.parse import urljoin, urldefrag, urlparse
 from urllib import robotparser
 
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 
 from langchain_text_splitters import RecursiveCharacterTextSplitter
@@ -15,8 +24,13 @@ from langchain_community.vectorstores import Chroma
 from langchain_ollama import OllamaEmbeddings
 from langchain_core.documents import Document
 
+import cleaner
+from cleaner import STRIP_SELECTORS, JUNK_PATTERNS, MIN_LINE_LENGTH
+
 PERSIST_DIR = os.getenv("PERSIST_DIR", "./vector_store/chroma_fedex")
 EMBED_MODEL = "nomic-embed-text"
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/")
+BM25_DIR = os.getenv("BM25_DIR", PERSIST_DIR.rstrip("/") + "_bm25")
 
 DOC_URLS = [
         "https://developer.fedex.com/api/en-us/home.html",
@@ -45,60 +59,46 @@ DOC_URLS = [
 
 USER_AGENT = "Mozilla/5.0 (FedEx RAG dev; macOS)"
 MAX_PAGES = 1000
-PATH_MUST_CONTAIN = "/*/en-us/"
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "8"))
+# Per-host politeness: steady requests/second and burst size. A robots.txt
+# Crawl-delay, when present, lowers the rate further.
+CRAWL_RATE = float(os.getenv("CRAWL_RATE", "3"))
+CRAWL_BURST = int(os.getenv("CRAWL_BURST", "3"))
+# On-disk HTTP cache (ETag/Last-Modified, raw body, cleaned text per URL).
+# Set HTTP_CACHE_DIR="" to disable; INGEST_OFFLINE=1 builds purely from it.
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", "./http_cache")
+INGEST_OFFLINE = os.getenv("INGEST_OFFLINE", "0") == "1"
+# Streaming pipeline: chunks are embedded in batches by a few workers fed
+# through a bounded queue, so memory stays flat and embedding overlaps fetching.
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "2"))
+EMBED_QUEUE_SIZE = int(os.getenv("EMBED_QUEUE_SIZE", "4"))
+# HTML cleaning is CPU-bound, so it runs in a process pool (0 = in the fetch threads).
+CLEAN_WORKERS = int(os.getenv("CLEAN_WORKERS", str(min(os.cpu_count() or 1, 8))))
+# Links are followed only into a localised section such as /api/en-us/ (any
+# first path segment). The old substring test "/*/en-us/" matched no real path,
+# so no links were followed at all.
+PATH_MUST_MATCH = re.compile(r"^/[^/]+/en-us/")
 SKIP_EXT = re.compile(r"\.(png|jpg|jpeg|gif|svg|pdf|zip|css|js|ico|mp4|mp3|woff2?)$", re.I)
 
-STRIP_SELECTORS = [
-        "header", "nav", "footer", "aside",
-        "script", "style", "noscript", "iframe", "svg",
-        "[role='navigation']", "[role='banner']", "[role='contentinfo']",
-        ".breadcrumbs", ".cookie", ".banner", ".sidebar",
-        ".menu", ".nav", ".navbar", ".navigation",
-        ".sign-up", ".signup", ".login", ".log-in", ".signin", ".sign-in",
-        ".modal", ".overlay", ".popup",
-        ".header", ".footer", ".topbar", ".top-bar",
-        "form[action*='login']", "form[action*='signup']",
-        "[class*='menu']", "[class*='Menu']",
-        "[class*='nav-']", "[class*='Nav-']",
-        "[class*='cookie']", "[class*='Cookie']",
-        "[class*='sign-up']", "[class*='SignUp']",
-        "[class*='login']", "[class*='Login']",
-        "[class*='modal']", "[class*='Modal']",
-        "[class*='dropdown']", "[class*='Dropdown']",
-        "[id*='menu']", "[id*='nav']", "[id*='login']", "[id*='signup']",
-]
-
-JUNK_PATTERNS = re.compile(
-        r"^("
-        r"true|false|null|undefined"
-        r"|sign\s*up|log\s*in|log\s*out|sign\s*in|sign\s*out"
-        r"|sign\s*up\s+or\s+log\s*in"
-        r"|forgot\s*password.*"
-        r"|main\s*menu"
-        r"|menu"
-        r"|×|✕|close"
-        r"|home"
-        r"|get\s+access\s+to\s+fedex.*"
-        r"|united\s+states\s+engli.*"
-        r"|developer\s+portal\s*$"
-        r"|skip\s+to\s+.*"
-        r"|back\s+to\s+top"
-        r"|toggle\s+.*"
-        r"|expand\s+all|collapse\s+all"
-        r"|loading\.{0,3}"
-        r"|please\s+wait.*"
-        r"|copyright\s*©.*"
-        r"|all\s+rights\s+reserved.*"
-        r"|terms\s+(of\s+use|&\s+conditions).*"
-        r"|privacy\s+(policy|notice).*"
-        r"|cookie\s+(policy|preferences).*"
-        r")$",
-        re.I
-)
-
-MIN_LINE_LENGTH = 3
 MIN_DOC_LENGTH = 100
 
+# Partition key for routed retrieval; must match the slugs in the backend's PRODUCT_ROUTES.
+PRODUCT_RE = re.compile(r"/catalog/([A-Za-z0-9-]+?)(?:\.html|/|$)")
+PRODUCT_SECTIONS = {"guides": "guides", "api-recipes": "recipes"}
+
+
+def product_from_url(u: str) -> str:
+        """`/catalog/track/v1/docs.html` -> "track"; guides and recipes get their own partition."""
+        path = urlparse(u).path
+        m = PRODUCT_RE.search(path)
+        if m:
+                return m.group(1).lower()
+        for part in path.lower().split("/"):
+                part = part.removesuffix(".html")
+                if part in PRODUCT_SECTIONS:
+                        return PRODUCT_SECTIONS[part]
+        return "general"
 
 def clean_url(u: str) -> str:
         u, _ = urldefrag(u or "")
@@ -107,29 +107,202 @@ def clean_url(u: str) -> str:
 def same_site(u: str, root_netloc: str) -> bool:
         return urlparse(u).netloc == root_netloc
 
+session = requests.Session()
+session.headers.update({"User-Agent": USER_AGENT})
+session.mount("http://", HTTPAdapter(pool_maxsize=CRAWL_WORKERS))
+session.mount("https://", HTTPAdapter(pool_maxsize=CRAWL_WORKERS))
+
+class RobotsCache:
+        """One parsed robots.txt per netloc, downloaded on first use."""
+
+        def __init__(self, ua: str = USER_AGENT):
+                self.ua = ua
+                self._parsers: dict[str, Optional[robotparser.RobotFileParser]] = {}
+                # Hosts whose robots.txt answered with a server error.
+                self._unavailable: set[str] = set()
+                self._lock = threading.Lock()
+
+        def _parser(self, url: str) -> Optional[robotparser.RobotFileParser]:
+                if INGEST_OFFLINE:
+                        return None
+                parsed = urlparse(url)
+                with self._lock:
+                        if parsed.netloc in self._parsers:
+                                return self._parsers[parsed.netloc]
+                        robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
+                        rp: Optional[robotparser.RobotFileParser] = robotparser.RobotFileParser(robots_url)
+                        try:
+                                r = session.get(robots_url, timeout=15)
+                                # Same status handling as RobotFileParser.read(): 401/403
+                                # forbid the whole host, other 4xx mean no robots.txt, and
+                                # a server error leaves nothing fetchable.
+                                if r.status_code in (401, 403):
+                                        rp.disallow_all = True
+                                elif 400 <= r.status_code < 500:
+                                        rp.allow_all = True
+                                elif r.status_code >= 500:
+                                        rp.disallow_all = True
+                                        self._unavailable.add(parsed.netloc)
+                                else:
+                                        rp.parse(r.text.splitlines())
+                        except Exception:
+                                rp = None
+                        self._parsers[parsed.netloc] = rp
+                        return rp
+
+        def allowed(self, url: str) -> bool:
+                rp = self._parser(url)
+                return rp is None or rp.can_fetch(self.ua, url)
+
+        def unavailable(self, url: str) -> bool:
+                """True if the host's robots.txt could not be read (5xx), so nothing was fetched."""
+                self._parser(url)
+                return urlparse(url).netloc in self._unavailable
+
+        def crawl_delay(self, url: str) -> Optional[float]:
+                rp = self._parser(url)
+                delay = rp.crawl_delay(self.ua) if rp is not None else None
+                return float(delay) if delay else None
+
+robots = RobotsCache()
+
+class HostRateLimiter:
+        """Token bucket per host; acquire() blocks until a request may be sent."""
+
+        def __init__(self, rate: float = CRAWL_RATE, burst: int = CRAWL_BURST):
+                self.rate = rate
+                self.burst = burst
+                self._buckets: dict[str, list[float]] = {}
+                self._lock = threading.Lock()
+
+        def _host_limits(self, url: str) -> tuple[float, int]:
+                # A Crawl-delay asks for spacing between requests, so no bursting.
+                delay = robots.crawl_delay(url)
+                if delay:
+                        return min(self.rate, 1.0 / delay), 1
+                return self.rate, self.burst
+
+        def acquire(self, url: str) -> None:
+                netloc = urlparse(url).netloc
+                rate, burst = self._host_limits(url)
+                while True:
+                        with self._lock:
+                                now = time.monotonic()
+                                bucket = self._buckets.setdefault(netloc, [float(burst), now])
+                                tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                                bucket[1] = now
+                                if tokens >= 1:
+                                        bucket[0] = tokens - 1
+                                        return
+                                bucket[0] = tokens
+                                wait = (1 - tokens) / rate
+                        time.sleep(wait)
+
+rate_limiter = HostRateLimiter()
+
 def allowed_by_robots(url: str, ua: str = USER_AGENT) -> bool:
-        parsed = urlparse(url)
-        robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
-        rp = robotparser.RobotFileParser()
-        try:
-                rp.set_url(robots_url)
-                rp.read()
-                return rp.can_fetch(ua, url)
-        except Exception:
-                return True
+        return robots.allowed(url)
 
-def get_one_hop_links(seed: str) -> set[str]:
-        links: set[str] = set()
-        root = urlparse(seed)
-        headers = {"User-Agent": USER_AGENT}
+class HttpCache:
+        """Per-URL validators, raw body and cleaned text, one file pair per URL."""
+
+        def __init__(self, root: str):
+                self.root = root
+
+        def _path(self, url: str, ext: str) -> str:
+                key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+                return os.path.join(self.root, f"{key}.{ext}")
+
+        def _write(self, path: str, text: str) -> None:
+                # Created on first write, so merely importing ingest leaves no directory behind.
+                os.makedirs(self.root, exist_ok=True)
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                        f.write(text)
+                os.replace(tmp, path)
+
+        def get(self, url: str) -> Optional[dict]:
+                try:
+                        with open(self._path(url, "json"), encoding="utf-8") as f:
+                                meta = json.load(f)
+                        with open(self._path(url, "html"), encoding="utf-8") as f:
+                                meta["body"] = f.read()
+                        return meta
+                except (OSError, ValueError):
+                        return None
+
+        def put(self, url: str, etag: Optional[str], last_modified: Optional[str], body: str) -> None:
+                # A new body invalidates the cleaned text until set_cleaned() runs.
+                self._write(self._path(url, "html"), body)
+                self._write(self._path(url, "json"), json.dumps({
+                        "url": url,
+                        "etag": etag,
+                        "last_modified": last_modified,
+                        "fetched_at": datetime.utcnow().isoformat(),
+                        "cleaned": None,
+                }))
+
+        def set_cleaned(self, url: str, cleaned: str) -> None:
+                path = self._path(url, "json")
+                try:
+                        with open(path, encoding="utf-8") as f:
+                                meta = json.load(f)
+                except (OSError, ValueError):
+                        return
+                meta["cleaned"] = cleaned
+                self._write(path, json.dumps(meta))
+
+http_cache = HttpCache(HTTP_CACHE_DIR) if HTTP_CACHE_DIR else None
+
+class Page(NamedTuple):
+        html: str
+        # Cleaned text from the HTTP cache when the page was not modified.
+        cleaned: Optional[str] = None
+
+def fetch(url: str, timeout: int = 20, progress: Optional["Progress"] = None) -> Optional[Page]:
+        entry = http_cache.get(url) if http_cache else None
+        if INGEST_OFFLINE:
+                if entry is None:
+                        print(f"[WARN] Not in HTTP cache (offline): {url}")
+                        if progress is not None:
+                                progress.mark("failed", url)
+                        return None
+                return Page(entry["body"], entry.get("cleaned"))
+
+        headers = {}
+        if entry:
+                if entry.get("etag"):
+                        headers["If-None-Match"] = entry["etag"]
+                if entry.get("last_modified"):
+                        headers["If-Modified-Since"] = entry["last_modified"]
+
+        rate_limiter.acquire(url)
         try:
-                r = requests.get(seed, headers=headers, timeout=15)
+                r = session.get(url, headers=headers, timeout=timeout)
+                if r.status_code == 304 and entry:
+                        return Page(entry["body"], entry.get("cleaned"))
                 r.raise_for_status()
         except Exception as e:
-                print(f"[WARN] Fetch failed: {seed} -> {e}")
+                print(f"[WARN] Fetch failed: {url} -> {e}")
+                if progress is not None:
+                        status = getattr(getattr(e, "response", None), "status_code", None)
+                        progress.mark("gone" if status in (404, 410) else "failed", url)
+                return None
+        if http_cache:
+                http_cache.put(url, r.headers.get("ETag"), r.headers.get("Last-Modified"), r.text)
+        return Page(r.text)
+
+def get_one_hop_links(seed: str, pages: Optional[dict] = None, progress: Optional["Progress"] = None) -> set[str]:
+        """Links one hop from `seed`; its fetched page is kept in `pages` for cleaning."""
+        links: set[str] = set()
+        root = urlparse(seed)
+        page = fetch(seed, timeout=15, progress=progress)
+        if page is None:
                 return links
 
-        soup = BeautifulSoup(r.text, "lxml")
+        soup = BeautifulSoup(page.html, "lxml")
+        if pages is not None:
+                pages[seed] = page
         for a in soup.find_all("a", href=True):
                 href = a["href"]
                 abs_url = clean_url(urljoin(seed, href))
@@ -139,31 +312,41 @@ def get_one_hop_links(seed: str) -> set[str]:
                         continue
                 if not same_site(abs_url, root.netloc):
                         continue
-                if PATH_MUST_CONTAIN and PATH_MUST_CONTAIN not in urlparse(abs_url).path:
+                if PATH_MUST_MATCH is not None and not PATH_MUST_MATCH.search(urlparse(abs_url).path):
                         continue
                 links.add(abs_url)
         return links
 
-def crawl_one_level(seeds: list[str]) -> list[str]:
-        seeds = [clean_url(s) for s in seeds if s]
-        seeds = [s for s in seeds if allowed_by_robots(s)]
+def crawl_one_level(seeds: list[str], pages: Optional[dict] = None, progress: Optional["Progress"] = None) -> list[str]:
+        def allowed(u: str) -> bool:
+                if allowed_by_robots(u):
+                        return True
+                if progress is not None:
+                        progress.mark("unavailable" if robots.unavailable(u) else "denied", u)
+                return False
+
+        seeds = list(dict.fromkeys(clean_url(s) for s in seeds if s))
+        seeds = [s for s in seeds if allowed(s)]
         seen: set[str] = set(seeds)
 
-        for s in seeds:
-                if len(seen) >= MAX_PAGES:
-                        break
-                if not allowed_by_robots(s):
-                        continue
-                for u in get_one_hop_links(s):
+        with ThreadPoolExecutor(max_workers=CRAWL_WORKERS) as pool:
+                # map() keeps seed order, so MAX_PAGES truncation matches a serial crawl.
+                for links in pool.map(lambda s: get_one_hop_links(s, pages, progress), seeds):
                         if len(seen) >= MAX_PAGES:
                                 break
-                        if allowed_by_robots(u):
-                                seen.add(u)
-                time.sleep(0.4)
+                        for u in sorted(links):
+                                if len(seen) >= MAX_PAGES:
+                                        break
+                                if u not in seen and allowed(u):
+                                        seen.add(u)
         return sorted(seen)
 
-def strip_boilerplate(html: str) -> str:
-        soup = BeautifulSoup(html, "lxml")
+def strip_boilerplate(html: Union[str, BeautifulSoup]) -> str:
+        """
+        Reference cleaner: one soup.select() per selector. Ingest uses
+        cleaner.clean_html(), which must produce the same text.
+        """
+        soup = html if isinstance(html, BeautifulSoup) else BeautifulSoup(html, "lxml")
         for sel in STRIP_SELECTORS:
                 for el in soup.select(sel):
                         el.decompose()
@@ -180,65 +363,299 @@ def strip_boilerplate(html: str) -> str:
                 lines.append(ln)
         return "\n".join(lines)
 
-def fetch_and_clean(url: str) -> Optional[str]:
-        headers = {"User-Agent": USER_AGENT}
+_clean_pool: Optional[ProcessPoolExecutor] = None
+
+def clean_pool_context():
+        # Workers start lazily from fetch threads while embed and HTTP pool threads
+        # are running, so never fork this process: forkserver (or spawn) starts
+        # them from a clean single-threaded parent.
+        if "forkserver" in multiprocessing.get_all_start_methods():
+                ctx = multiprocessing.get_context("forkserver")
+                ctx.set_forkserver_preload(["cleaner"])
+                return ctx
+        return multiprocessing.get_context("spawn")
+
+def clean_html(html: str) -> str:
+        if _clean_pool is None:
+                return cleaner.clean_html(html)
+        return _clean_pool.submit(cleaner.clean_html, html).result()
+
+def clean_page(url: str, page: Page) -> str:
+        if page.cleaned is not None:
+                return page.cleaned
+        cleaned = clean_html(page.html)
+        if http_cache:
+                http_cache.set_cleaned(url, cleaned)
+        return cleaned
+
+def fetch_and_clean(url: str, pages: Optional[dict] = None, progress: Optional["Progress"] = None) -> Optional[str]:
+        # Seeds were already downloaded and parsed during the crawl; reuse that
+        # snapshot so links and content come from the same page.
+        page = pages.pop(url, None) if pages else None
+        if page is None:
+                page = fetch(url, progress=progress)
+                if page is None:
+                        return None
+        cleaned = clean_page(url, page)
+        if progress is not None:
+                progress.mark("fetched", url)
+        return cleaned
+
+def iter_docs_one_level(seeds: list[str], progress: Optional["Progress"] = None):
+        """
+        Yield cleaned pages in crawl order as they are fetched, a bounded window
+        at a time. With `progress`, each URL's outcome (fetched, gone, failed,
+        denied by robots.txt or skipped because robots.txt was unavailable) is
+        recorded there.
+        """
+        global _clean_pool
+        if CLEAN_WORKERS > 0 and _clean_pool is None:
+                _clean_pool = ProcessPoolExecutor(max_workers=CLEAN_WORKERS, mp_context=clean_pool_context())
         try:
-                r = requests.get(url, headers=headers, timeout=20)
-                r.raise_for_status()
-        except Exception as e:
-                print(f"[WARN] Fetch failed: {url} -> {e}")
-                return None
-        return strip_boilerplate(r.text)
+                yield from _iter_docs_one_level(seeds, progress)
+        finally:
+                if _clean_pool is not None:
+                        _clean_pool.shutdown()
+                        _clean_pool = None
 
-def load_docs_one_level(seeds: list[str]):
-        urls = crawl_one_level(seeds)
+def _iter_docs_one_level(seeds: list[str], progress: Optional["Progress"] = None):
+        pages: dict = {}
+        urls = crawl_one_level(seeds, pages, progress)
         print(f"[crawl] total URLs (seeds + 1-hop): {len(urls)}")
 
         ts = datetime.utcnow().isoformat()
-        docs = []
-        for i, url in enumerate(urls):
-                print(f"[fetch {i+1}/{len(urls)}] {url}")
-                cleaned = fetch_and_clean(url)
-                if not cleaned or len(cleaned) < MIN_DOC_LENGTH:
-                        print(f"  -> skipped (too short or empty)")
-                        continue
-                doc = Document(
-                        page_content=cleaned,
-                        metadata={
-                                "source": url,
-                                "ingested_at": ts,
-                        }
-                )
-                docs.append(doc)
-                time.sleep(0.3)
-        return docs
+        with ThreadPoolExecutor(max_workers=CRAWL_WORKERS) as pool:
+                pending: deque = deque()
+                todo = iter(urls)
+                for url in todo:
+                        pending.append((url, pool.submit(fetch_and_clean, url, pages, progress)))
+                        if len(pending) >= CRAWL_WORKERS * 2:
+                                break
+                i = 0
+                while pending:
+                        url, fut = pending.popleft()
+                        nxt = next(todo, None)
+                        if nxt is not None:
+                                pending.append((nxt, pool.submit(fetch_and_clean, nxt, pages, progress)))
+                        cleaned = fut.result()
+                        i += 1
+                        print(f"[fetch {i}/{len(urls)}] {url}")
+                        if not cleaned or len(cleaned) < MIN_DOC_LENGTH:
+                                print(f"  -> skipped (too short or empty)")
+                                continue
+                        yield Document(
+                                page_content=cleaned,
+                                metadata={
+                                        "source": url,
+                                        "product": product_from_url(url),
+                                        "ingested_at": ts,
+                                }
+                        )
 
 def clean_and_chunk(docs, chunk_size=2500, chunk_overlap=400):
         splitter = RecursiveCharacterTextSplitter(
                 chunk_size=chunk_size,
                 chunk_overlap=chunk_overlap,
                 separators=["---", "\n\n", "\n", " ", ""],
+                # start_index lets the backend merge overlapping neighbours.
+                add_start_index=True,
         )
         return splitter.split_documents(docs)
 
 def build_embeddings():
-        return OllamaEmbeddings(model=EMBED_MODEL)
+        return OllamaEmbeddings(model=EMBED_MODEL, base_url=OLLAMA_BASE_URL)
 
-def build_or_update_vectorstore(chunks, persist_dir=PERSIST_DIR):
-        embeddings = build_embeddings()
-        if os.path.exists(persist_dir) and os.listdir(persist_dir):
-                db = Chroma(persist_directory=persist_dir, embedding_function=embeddings)
-                db.add_documents(chunks)
-                db.persist()
-        else:
-                db = Chroma.from_documents(
-                        documents=chunks,
-                        embedding=embeddings,
-                        persist_directory=persist_dir
+def chunk_id(chunk) -> str:
+        """Deterministic ID: source URL hash + content hash."""
+        src = chunk.metadata.get("source", "")
+        src_hash = hashlib.sha1(src.encode("utf-8")).hexdigest()[:16]
+        content_hash = hashlib.sha1(chunk.page_content.encode("utf-8")).hexdigest()
+        return f"{src_hash}-{content_hash}"
+
+class Progress:
+        def __init__(self):
+                self.started = time.perf_counter()
+                self.pages = 0
+                self.chunks = 0
+                self.embedded = 0
+                self.skipped = 0
+                self.failed = 0
+                # Per-URL crawl outcomes: cleaned, 404/410, fetch error, robots.txt
+                # denial, robots.txt server error.
+                self.fetched_sources: set[str] = set()
+                self.gone_sources: set[str] = set()
+                self.failed_sources: set[str] = set()
+                self.denied_sources: set[str] = set()
+                self.unavailable_sources: set[str] = set()
+                self._lock = threading.Lock()
+
+        def add(self, **counts: int) -> None:
+                with self._lock:
+                        for name, n in counts.items():
+                                setattr(self, name, getattr(self, name) + n)
+
+        def mark(self, outcome: str, url: str) -> None:
+                with self._lock:
+                        getattr(self, f"{outcome}_sources").add(url)
+
+        def report(self, label: str = "progress") -> None:
+                elapsed = max(time.perf_counter() - self.started, 1e-6)
+                print(
+                        f"[{label}] pages={self.pages} ({self.pages / elapsed:.1f}/s) "
+                        f"chunks={self.chunks} ({self.chunks / elapsed:.1f}/s) "
+                        f"embedded={self.embedded} ({self.embedded / elapsed:.1f}/s) "
+                        f"skipped={self.skipped} failed={self.failed} "
+                        f"fetch_failed={len(self.failed_sources)} denied={len(self.denied_sources)} "
+                        f"robots_unavailable={len(self.unavailable_sources)} "
+                        f"elapsed={elapsed:.1f}s"
                 )
-                db.persist()
+
+def run_pipeline(seeds: list[str], persist_dir=PERSIST_DIR):
+        """
+        Streaming ingest: pages -> chunks -> batched embeddings -> store writes.
+
+        Incremental: chunks whose ID is already stored are skipped (their
+        metadata refreshed if stale), new ones are embedded and upserted, and
+        stored chunks of pages that were re-fetched or answered 404/410 but are
+        not produced by this run are deleted at the end, unless a batch failed
+        to embed.
+        """
+        embeddings = build_embeddings()
+        db = Chroma(persist_directory=persist_dir, embedding_function=embeddings)
+        existing = db.get(include=["metadatas"])
+        existing_ids = set(existing["ids"])
+        existing_sources = {(m or {}).get("source") for m in existing["metadatas"]}
+        # Unchanged chunks keep their ID, so their metadata is refreshed in place
+        # when it is out of date: stored before product tags existed, or moved
+        # by an edit earlier on the page (start_index). Vectors are unchanged.
+        stored_meta = {i: m or {} for i, m in zip(existing["ids"], existing["metadatas"])}
+        del existing
+        retag: list = []
+
+        progress = Progress()
+        batches: queue.Queue = queue.Queue(maxsize=EMBED_QUEUE_SIZE)
+        write_lock = threading.Lock()
+        counts = {"added": 0, "updated": 0}
+
+        def embed_worker():
+                while True:
+                        batch = batches.get()
+                        if batch is None:
+                                return
+                        ids = [i for i, _ in batch]
+                        docs = [d for _, d in batch]
+                        try:
+                                vectors = embeddings.embed_documents([d.page_content for d in docs])
+                                # Vectors are computed here, so write them straight to the
+                                # collection instead of letting the wrapper embed again.
+                                with write_lock:
+                                        db._collection.upsert(
+                                                ids=ids,
+                                                embeddings=vectors,
+                                                documents=[d.page_content for d in docs],
+                                                metadatas=[d.metadata for d in docs],
+                                        )
+                        except Exception as e:
+                                print(f"[WARN] Embedding batch of {len(batch)} failed -> {e}")
+                                progress.add(failed=len(batch))
+                                continue
+                        updated = sum(1 for d in docs if d.metadata.get("source") in existing_sources)
+                        with write_lock:
+                                counts["updated"] += updated
+                                counts["added"] += len(batch) - updated
+                        progress.add(embedded=len(batch))
+                        progress.report()
+
+        workers = [threading.Thread(target=embed_worker, daemon=True) for _ in range(max(1, EMBED_WORKERS))]
+        for w in workers:
+                w.start()
+
+        seen: set[str] = set()
+        pending: list = []
+        try:
+                for doc in iter_docs_one_level(seeds, progress):
+                        progress.add(pages=1)
+                        for chunk in clean_and_chunk([doc]):
+                                cid = chunk_id(chunk)
+                                if cid in seen:
+                                        continue
+                                seen.add(cid)
+                                progress.add(chunks=1)
+                                if cid in existing_ids:
+                                        progress.add(skipped=1)
+                                        stored = stored_meta[cid]
+                                        if "product" not in stored or stored.get("start_index") != chunk.metadata.get("start_index"):
+                                                retag.append((cid, chunk.metadata))
+                                        continue
+                                pending.append((cid, chunk))
+                                if len(pending) >= EMBED_BATCH_SIZE:
+                                        batches.put(pending)
+                                        pending = []
+                if pending:
+                        batches.put(pending)
+        finally:
+                for _ in workers:
+                        batches.put(None)
+                for w in workers:
+                        w.join()
+
+        for i in range(0, len(retag), EMBED_BATCH_SIZE * 8):
+                batch = retag[i:i + EMBED_BATCH_SIZE * 8]
+                db._collection.update(ids=[c for c, _ in batch], metadatas=[m for _, m in batch])
+        if retag:
+                print(f"[store] refreshed metadata on {len(retag)} existing chunks")
+
+        # Only pages this run fetched and cleaned (their old chunks were replaced)
+        # or that answered 404/410 lose chunks. Fetch errors, robots.txt denials
+        # or outages, MAX_PAGES cut-offs and pages no longer linked keep theirs.
+        refreshed = progress.fetched_sources | progress.gone_sources
+        to_delete = [i for i in existing_ids if i not in seen and stored_meta[i].get("source") in refreshed]
+        unreached = progress.failed_sources | progress.denied_sources | progress.unavailable_sources
+        if unreached - progress.fetched_sources:
+                print(f"[WARN] {len(progress.failed_sources)} pages failed to fetch, {len(progress.denied_sources)} "
+                      f"were denied by robots.txt and {len(progress.unavailable_sources)} were skipped because "
+                      f"robots.txt was unavailable; their stored chunks are kept")
+        if progress.failed:
+                print(f"[WARN] {progress.failed} chunks failed to embed; keeping {len(to_delete)} stale chunks")
+                to_delete = []
+        if to_delete:
+                db.delete(ids=to_delete)
+        db.persist()
+        progress.report("done")
+        print(
+                f"[store] added={counts['added']} updated={counts['updated']} "
+                f"deleted={len(to_delete)} skipped={progress.skipped}"
+        )
         return db
 
+def build_bm25_index(db, out_dir=BM25_DIR):
+        """
+        Publish every chunk in the store for the backend's BM25 index.
+
+        Only the texts and metadata are written; apps/backend/lexical.py
+        tokenizes them and builds the postings, so indexing and querying
+        always use the same tokenizer.
+        """
+        data = db.get(include=["documents", "metadatas"])
+        tmp_dir = out_dir.rstrip("/") + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        with open(os.path.join(tmp_dir, "chunks.json"), "w", encoding="utf-8") as f:
+                json.dump({
+                        "ids": data["ids"],
+                        "documents": data["documents"],
+                        "metadatas": data["metadatas"],
+                }, f)
+        # Written last; the backend reloads when this version changes.
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({
+                        "version": datetime.utcnow().strftime("%Y%m%dT%H%M%S%f"),
+                        "chunks": len(data["ids"]),
+                }, f)
+        shutil.rmtree(out_dir, ignore_errors=True)
+        os.replace(tmp_dir, out_dir)
+        print(f"[bm25] published {len(data['ids'])} chunks -> {out_dir}")
+
 def sanity_check(db):
         q = "How do I get an OAuth token?"
         hits = db.similarity_search(q, k=3)
@@ -248,16 +665,11 @@ def sanity_check(db):
                 print(f"[{i}] source: {src}\n{h.page_content[:400]}...\n")
 
 def main():
-        print("Crawling & loading docs (one level deep)...")
-        docs = load_docs_one_level(DOC_URLS)
-        print(f"Loaded {len(docs)} pages")
-
-        print("Chunking...")
-        chunks = clean_and_chunk(docs)
-        print(f"Created {len(chunks)} chunks")
-
-        print("Building vector store (this can take a minute on first run)...")
-        db = build_or_update_vectorstore(chunks)
+        if INGEST_OFFLINE:
+                print(f"Offline mode: rebuilding from HTTP cache at {HTTP_CACHE_DIR}")
+        print("Crawling, chunking and embedding docs (one level deep)...")
+        db = run_pipeline(DOC_URLS)
+        build_bm25_index(db)
 
         print(f"Persisted to {PERSIST_DIR}")
         sanity_check(db)
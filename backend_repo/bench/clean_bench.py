@@ -0,0 +1,114 @@
+# clean_bench.py
+"""
+Micro-benchmark for HTML cleaning: ingest.strip_boilerplate() (BeautifulSoup,
+one select() per selector) against cleaner.clean_html() (single lxml pass),
+serially and in a process pool. Every page is also checked for identical output.
+
+Pages come from --html-dir (any *.html files, e.g. an ingest HTTP_CACHE_DIR
+with saved FedEx docs) or, by default, from the synthetic fixture site wrapped
+in portal-sized header/menu/footer markup.
+
+Example:
+    python bench/clean_bench.py --pages 300 --workers 1 4 8
+    python bench/clean_bench.py --html-dir apps/ingest/http_cache
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "apps", "ingest"))
+
+import cleaner
+from ingest import strip_boilerplate
+from fixtures import FixtureSite, PRODUCTS
+
+def portal_chrome(links: int = 120) -> tuple:
+        """Header/mega-menu/footer markup of roughly the size the real portal ships."""
+        menu = "".join(
+                f"<li class='menu-item'><a class='nav-link' href='/api/en-us/catalog/{p}.html'>{title}</a>"
+                f"<ul class='dropdown-menu'>{''.join(f'<li><a href=/x/{i}>Item {i}</a></li>' for i in range(links // len(PRODUCTS)))}</ul></li>"
+                for p, (title, _) in PRODUCTS.items()
+        )
+        top = (
+                "<head><title>FedEx Developer Portal</title><style>.a{color:red}</style>"
+                "<script>window.dataLayer = [];</script></head>"
+                f"<div id='main-navigation' class='MainMenu'><ul class='menu'>{menu}</ul></div>"
+                "<div class='cookie-consent modal'><p>We use cookies to improve your experience.</p>"
+                "<button>Cookie preferences</button></div>"
+                "<div class='breadcrumbs'><a href='/'>Home</a> / <a href='/api'>API</a></div>"
+                "<form action='/login'><input name='user'><button>Log in</button></form>"
+                "<svg class='icon'><path d='M0 0h24v24H0z'/></svg>"
+        )
+        bottom = (
+                "<aside class='sidebar'><ul>" + "".join(f"<li>Related {i}</li>" for i in range(20)) + "</ul></aside>"
+                "<footer class='footer'><ul>" + "".join(f"<li><a href='/f/{i}'>Footer link {i}</a></li>" for i in range(40)) + "</ul>"
+                "<p>Copyright © FedEx 1995-2026. All rights reserved.</p></footer>"
+                "<script>(function(){ /* analytics */ })();</script>"
+        )
+        return top, bottom
+
+def fixture_pages(n: int) -> List[str]:
+        site = FixtureSite(pages=n)
+        top, bottom = portal_chrome()
+        pages = []
+        for path, html in site.pages.items():
+                if not path.endswith(".html"):
+                        continue
+                pages.append(html.replace("<html><body>", f"<html>{top}<body>", 1).replace("</body>", f"{bottom}</body>", 1))
+        return pages
+
+def load_pages(html_dir: str) -> List[str]:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(html_dir, "**", "*.html"), recursive=True)):
+                with open(path, encoding="utf-8", errors="replace") as f:
+                        pages.append(f.read())
+        return pages
+
+def timed(fn, pages: List[str]) -> tuple:
+        started = time.perf_counter()
+        out = [fn(p) for p in pages]
+        return out, time.perf_counter() - started
+
+def main():
+        ap = argparse.ArgumentParser(description="Benchmark and parity-check the HTML cleaners.")
+        ap.add_argument("--html-dir", help="Directory of saved .html pages (default: synthetic fixtures)")
+        ap.add_argument("--pages", type=int, default=200, help="Synthetic pages when --html-dir is not given")
+        ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+        args = ap.parse_args()
+
+        pages = load_pages(args.html_dir) if args.html_dir else fixture_pages(args.pages)
+        if not pages:
+                sys.exit(f"no .html pages found in {args.html_dir}")
+        mb = sum(len(p) for p in pages) / 1e6
+        print(f"[clean] {len(pages)} pages, {mb:.1f} MB of HTML")
+
+        reference, ref_s = timed(strip_boilerplate, pages)
+        print(f"[clean] strip_boilerplate (bs4)   {ref_s * 1000 / len(pages):7.2f} ms/page  {len(pages) / ref_s:8.1f} pages/s")
+        fast, fast_s = timed(cleaner.clean_html, pages)
+        print(f"[clean] cleaner.clean_html (lxml) {fast_s * 1000 / len(pages):7.2f} ms/page  {len(pages) / fast_s:8.1f} pages/s  ({ref_s / fast_s:.1f}x)")
+
+        pool_consistent = True
+        for n in sorted(set(args.workers)):
+                with ProcessPoolExecutor(max_workers=n) as pool:
+                        list(pool.map(cleaner.clean_html, pages[:n]))  # start the workers
+                        started = time.perf_counter()
+                        pooled = list(pool.map(cleaner.clean_html, pages, chunksize=4))
+                        pool_s = time.perf_counter() - started
+                print(f"[clean] process pool, {n:>2} workers  {len(pages) / pool_s:8.1f} pages/s  ({ref_s / pool_s:.1f}x)")
+                pool_consistent = pool_consistent and pooled == fast
+
+        mismatches = [i for i, (a, b) in enumerate(zip(reference, fast)) if a != b]
+        if not pool_consistent:
+                print("[clean] OUTPUT MISMATCH between pooled and in-process cleaning")
+                sys.exit(1)
+        if mismatches:
+                print(f"[clean] OUTPUT MISMATCH on {len(mismatches)} pages, first at index {mismatches[0]}")
+                sys.exit(1)
+        print(f"[clean] output identical on all {len(pages)} pages")
+
+if __name__ == "__main__":
+        main()
@@ -0,0 +1,145 @@
+# fake_ollama.py
+"""
+Local stand-in for the Ollama HTTP API, for offline benchmarks.
+
+Serves /api/embed, /api/embeddings, /api/generate and /api/chat with
+deterministic hashed bag-of-words embeddings and canned token streams.
+Latency and token rate are configurable so runs are reproducible.
+"""
+import re
+import json
+import time
+import argparse
+import hashlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+WORD_RE = re.compile(r"[A-Za-z0-9_]+")
+ANSWER = (
+        "To request an OAuth token, POST to /oauth/token with grant_type=client_credentials, "
+        "your client_id and client_secret. Use the returned access_token as a Bearer token "
+        "when calling the Ship, Rate and Track APIs. "
+)
+
+def embed(text: str, dim: int) -> list:
+        vec = np.zeros(dim, dtype=np.float32)
+        for word in WORD_RE.findall(text.lower()):
+                h = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+                vec[h % dim] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = float(np.linalg.norm(vec)) or 1.0
+        return (vec / norm).tolist()
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        config: argparse.Namespace = None
+
+        def log_message(self, *args):
+                pass
+
+        def _json(self, obj, status: int = 200) -> None:
+                body = json.dumps(obj).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        def _chunk(self, obj) -> None:
+                line = (json.dumps(obj) + "\n").encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+
+        def do_GET(self):
+                if self.path in ("/api/tags", "/api/ps"):
+                        return self._json({"models": [{"name": "llama3:latest"}, {"name": "nomic-embed-text:latest"}]})
+                self._json({"status": "ok"})
+
+        def do_POST(self):
+                cfg = self.config
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+
+                if self.path in ("/api/embed", "/api/embeddings"):
+                        inputs = body.get("input", body.get("prompt", ""))
+                        inputs = [inputs] if isinstance(inputs, str) else inputs
+                        time.sleep((cfg.embed_latency_ms + cfg.embed_per_item_ms * len(inputs)) / 1000)
+                        vectors = [embed(t, cfg.dim) for t in inputs]
+                        if self.path == "/api/embeddings":
+                                return self._json({"embedding": vectors[0]})
+                        return self._json({"model": body.get("model"), "embeddings": vectors})
+
+                if self.path in ("/api/generate", "/api/chat"):
+                        return self._generate(body, chat=self.path == "/api/chat")
+
+                self._json({"error": f"unknown path {self.path}"}, status=404)
+
+        def _generate(self, body: dict, chat: bool) -> None:
+                cfg = self.config
+                prompt = body.get("system", "") + (body.get("prompt") or json.dumps(body.get("messages", [])))
+                words = ANSWER.split(" ")
+                tokens = [(" " if i else "") + words[i % len(words)] for i in range(cfg.tokens)]
+                prompt_tokens = max(1, len(prompt) // 4)
+                token_delay = 1.0 / cfg.tokens_per_sec if cfg.tokens_per_sec > 0 else 0.0
+
+                def piece(text: str) -> dict:
+                        if chat:
+                                return {"model": body.get("model"), "message": {"role": "assistant", "content": text}}
+                        return {"model": body.get("model"), "response": text}
+
+                started = time.perf_counter()
+                time.sleep(cfg.ttft_ms / 1000)
+                prompt_done = time.perf_counter()
+                stats = lambda: {
+                        "done": True,
+                        "prompt_eval_count": prompt_tokens,
+                        "prompt_eval_duration": int((prompt_done - started) * 1e9),
+                        "eval_count": len(tokens),
+                        "eval_duration": int((time.perf_counter() - prompt_done) * 1e9),
+                        "total_duration": int((time.perf_counter() - started) * 1e9),
+                }
+
+                if not body.get("stream", True):
+                        time.sleep(token_delay * len(tokens))
+                        return self._json({**piece("".join(tokens)), **stats()})
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for token in tokens:
+                        self._chunk({**piece(token), "done": False})
+                        time.sleep(token_delay)
+                self._chunk({**piece(""), **stats()})
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+def make_server(host: str, port: int, config: argparse.Namespace) -> ThreadingHTTPServer:
+        handler = type("Handler", (FakeOllamaHandler,), {"config": config})
+        server = ThreadingHTTPServer((host, port), handler)
+        server.daemon_threads = True
+        return server
+
+def build_parser() -> argparse.ArgumentParser:
+        ap = argparse.ArgumentParser(description="Fake Ollama server for offline benchmarks.")
+        ap.add_argument("--host", default="127.0.0.1")
+        ap.add_argument("--port", type=int, default=11435)
+        ap.add_argument("--dim", type=int, default=768, help="Embedding dimension")
+        ap.add_argument("--embed-latency-ms", type=float, default=15, help="Fixed latency per embedding request")
+        ap.add_argument("--embed-per-item-ms", type=float, default=2, help="Extra latency per embedded text")
+        ap.add_argument("--ttft-ms", type=float, default=300, help="Prompt evaluation time before the first token")
+        ap.add_argument("--tokens-per-sec", type=float, default=40, help="Generation rate (0 = instant)")
+        ap.add_argument("--tokens", type=int, default=60, help="Tokens per answer")
+        return ap
+
+def main():
+        args = build_parser().parse_args()
+        server = make_server(args.host, args.port, args)
+        print(f"[fake-ollama] listening on http://{args.host}:{args.port}", flush=True)
+        try:
+                server.serve_forever()
+        except KeyboardInterrupt:
+                pass
+
+if __name__ == "__main__":
+        main()
@@ -0,0 +1,111 @@
+# fixtures.py
+"""
+Synthetic FedEx-style documentation site for offline benchmarks.
+
+Pages are generated deterministically from a seed, wrapped in the same kind
+of header/nav/footer boilerplate the real portal has, and served from a local
+HTTP server so the real ingest crawler can run against them.
+"""
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+PRODUCTS = {
+        "track": ("Track API", ["trackByTrackingNumber", "trackingInfo", "scanEvents", "latestStatusDetail"]),
+        "rate": ("Rate API", ["getRates", "rateRequest", "rateReplyDetails", "ratedShipmentDetails"]),
+        "ship": ("Ship API", ["createShipment", "labelSpecification", "requestedShipment", "FEDEX_GROUND"]),
+        "address-validation": ("Address Validation API", ["validateAddress", "addressesToValidate", "resolvedAddresses"]),
+        "shipment-visibility-webhook": ("Shipment Visibility Webhook", ["webhook", "notification", "eventType"]),
+        "authorization": ("OAuth", ["client_credentials", "access_token", "client_id", "client_secret"]),
+}
+
+FILLER = (
+        "The request body must be sent as JSON. Required fields are marked in the schema. "
+        "Responses include a transactionId that should be logged for support requests. "
+        "Use the sandbox environment for testing before moving to production. "
+        "Rate limits apply per project and are reported in the response headers. "
+        "Errors are returned with a code and a message describing the failing field. "
+).split(". ")
+
+BOILERPLATE_TOP = (
+        "<header class='header'><nav class='navbar'><a href='/'>Home</a><a href='/login'>Log in</a>"
+        "<a href='/signup'>Sign up</a></nav></header>"
+        "<div class='cookie-banner'>We use cookies. Cookie preferences</div>"
+)
+BOILERPLATE_BOTTOM = (
+        "<footer class='footer'>Copyright © FedEx. All rights reserved. Privacy policy. Terms of use.</footer>"
+        "<script>window.analytics = {};</script>"
+)
+
+QUESTIONS = [
+        ("How do I get an OAuth token?", "authorization"),
+        ("How do I track a package by tracking number?", "track"),
+        ("What does trackByTrackingNumber return?", "track"),
+        ("How do I get shipping rates for a package?", "rate"),
+        ("What fields are required in a getRates rateRequest?", "rate"),
+        ("How do I create a shipment with FEDEX_GROUND?", "ship"),
+        ("How do I set the labelSpecification when creating a label?", "ship"),
+        ("How do I validate an address?", "address-validation"),
+        ("How do I subscribe to shipment visibility webhook notifications?", "shipment-visibility-webhook"),
+        ("What is client_credentials used for?", "authorization"),
+]
+
+def page_path(product: str, n: int) -> str:
+        return f"/api/en-us/catalog/{product}/v1/docs-{n}.html"
+
+def make_page(product: str, n: int, rng: random.Random, paragraphs: int) -> str:
+        title, terms = PRODUCTS[product]
+        body = [f"<h1>{title} — section {n}</h1>"]
+        for p in range(paragraphs):
+                term = terms[(n + p) % len(terms)]
+                sentences = [f"The {title} uses {term} for this operation"]
+                sentences += rng.sample(FILLER, k=3)
+                body.append(f"<h2>{term}</h2><p>{'. '.join(s.strip() for s in sentences)}.</p>")
+                body.append(f"<pre>{{\"{term}\": {{\"accountNumber\": \"{rng.randint(10**8, 10**9)}\"}}}}</pre>")
+        return f"<html><body>{BOILERPLATE_TOP}<main>{''.join(body)}</main>{BOILERPLATE_BOTTOM}</body></html>"
+
+class FixtureSite:
+        """Generates `pages` documents and an index page linking to all of them."""
+
+        def __init__(self, pages: int = 200, paragraphs: int = 8, seed: int = 7):
+                rng = random.Random(seed)
+                products = list(PRODUCTS)
+                self.pages = {}
+                for i in range(pages):
+                        product = products[i % len(products)]
+                        self.pages[page_path(product, i)] = make_page(product, i, rng, paragraphs)
+                links = "".join(f"<a href='{p}'>{p}</a>" for p in self.pages)
+                self.pages["/api/en-us/home.html"] = f"<html><body>{BOILERPLATE_TOP}<main>{links}</main></body></html>"
+                self.pages["/robots.txt"] = "User-agent: *\nAllow: /\n"
+                self._server = None
+
+        def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+                pages = self.pages
+
+                class Handler(BaseHTTPRequestHandler):
+                        def log_message(self, *args):
+                                pass
+
+                        def do_GET(self):
+                                body = pages.get(self.path)
+                                if body is None:
+                                        self.send_response(404)
+                                        self.send_header("Content-Length", "0")
+                                        self.end_headers()
+                                        return
+                                data = body.encode("utf-8")
+                                self.send_response(200)
+                                self.send_header("Content-Type", "text/plain" if self.path.endswith(".txt") else "text/html")
+                                self.send_header("Content-Length", str(len(data)))
+                                self.end_headers()
+                                self.wfile.write(data)
+
+                self._server = ThreadingHTTPServer((host, port), Handler)
+                self._server.daemon_threads = True
+                threading.Thread(target=self._server.serve_forever, daemon=True).start()
+                return f"http://{host}:{self._server.server_address[1]}"
+
+        def stop(self) -> None:
+                if self._server is not None:
+                        self._server.shutdown()
+                        self._server.server_close()
@@ -0,0 +1,46 @@
+# ingest_job.py
+"""
+Run the real ingest pipeline once against a seed URL and print stats as JSON.
+
+Invoked as a subprocess by run_bench.py so its memory is measured on its own.
+Configuration (PERSIST_DIR, BM25_DIR, OLLAMA_BASE_URL, CRAWL_*, EMBED_*) comes
+from the environment, exactly as for apps/ingest/ingest.py.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "apps", "ingest"))
+
+import ingest
+
+def main():
+        ap = argparse.ArgumentParser(description="Benchmark one ingest run.")
+        ap.add_argument("--seed", required=True, help="Seed URL to crawl one level deep")
+        args = ap.parse_args()
+
+        started = time.perf_counter()
+        db = ingest.run_pipeline([args.seed], persist_dir=ingest.PERSIST_DIR)
+        pipeline_s = time.perf_counter() - started
+        ingest.build_bm25_index(db, ingest.BM25_DIR)
+        total_s = time.perf_counter() - started
+
+        data = db.get(include=["metadatas"])
+        pages = len({(m or {}).get("source") for m in data["metadatas"]})
+        chunks = len(data["ids"])
+        print(json.dumps({
+                "pages": pages,
+                "chunks": chunks,
+                "pipeline_s": round(pipeline_s, 3),
+                "total_s": round(total_s, 3),
+                "pages_per_s": round(pages / pipeline_s, 2) if pipeline_s else None,
+                "chunks_per_s": round(chunks / pipeline_s, 2) if pipeline_s else None,
+                # ru_maxrss is in KiB on Linux.
+                "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }))
+
+if __name__ == "__main__":
+        main()
@@ -0,0 +1,286 @@
+# run_bench.py
+"""
+Offline load/latency benchmark for the RAG backend.
+
+1. Starts fake_ollama.py and a synthetic doc site (fixtures.py).
+2. Runs the real ingest pipeline against them into a temporary store.
+3. Starts apps/backend/app.py under uvicorn on that store.
+4. Drives /chat, /chat/stream and /debug/retrieve at each concurrency level.
+5. Writes p50/p95/p99 latency, throughput and memory to a JSON file.
+
+Example:
+    python bench/run_bench.py --concurrency 1 4 16 --requests 64
+    python bench/run_bench.py --compare bench/results/bench-20260101-120000.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from fixtures import FixtureSite, QUESTIONS
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, "..", "apps", "backend")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+def free_port() -> int:
+        with socket.socket() as s:
+                s.bind(("127.0.0.1", 0))
+                return s.getsockname()[1]
+
+def wait_for(url: str, timeout: float = 60, ok_status: Optional[int] = None) -> None:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+                try:
+                        status = httpx.get(url, timeout=2).status_code
+                        if status == ok_status if ok_status is not None else status < 500:
+                                return
+                except httpx.HTTPError:
+                        pass
+                time.sleep(0.2)
+        raise RuntimeError(f"timed out waiting for {url}")
+
+def rss_mb(pid: int) -> Dict[str, Optional[float]]:
+        """Current and peak resident memory of a process, from /proc (Linux)."""
+        values: Dict[str, Optional[float]] = {"rss_mb": None, "peak_rss_mb": None}
+        try:
+                with open(f"/proc/{pid}/status") as f:
+                        for line in f:
+                                if line.startswith("VmRSS:"):
+                                        values["rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+                                elif line.startswith("VmHWM:"):
+                                        values["peak_rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+                pass
+        return values
+
+def git_rev() -> Optional[str]:
+        try:
+                return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, text=True).strip()
+        except Exception:
+                return None
+
+def summarize(latencies: List[float], errors: int, wall_s: float, ttfts: List[float]) -> dict:
+        lat = np.array(latencies) * 1000 if latencies else np.array([np.nan])
+        out = {
+                "requests": len(latencies) + errors,
+                "errors": errors,
+                "p50_ms": round(float(np.percentile(lat, 50)), 2),
+                "p95_ms": round(float(np.percentile(lat, 95)), 2),
+                "p99_ms": round(float(np.percentile(lat, 99)), 2),
+                "mean_ms": round(float(lat.mean()), 2),
+                "throughput_rps": round(len(latencies) / wall_s, 2) if wall_s else None,
+        }
+        if ttfts:
+                t = np.array(ttfts) * 1000
+                out["ttft_p50_ms"] = round(float(np.percentile(t, 50)), 2)
+                out["ttft_p95_ms"] = round(float(np.percentile(t, 95)), 2)
+        return out
+
+async def drive(base_url: str, endpoint: str, concurrency: int, total: int) -> dict:
+        sem = asyncio.Semaphore(concurrency)
+        latencies: List[float] = []
+        ttfts: List[float] = []
+        errors = 0
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+        async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+                async def one(i: int):
+                        nonlocal errors
+                        question = QUESTIONS[i % len(QUESTIONS)][0]
+                        async with sem:
+                                started = time.perf_counter()
+                                try:
+                                        if endpoint == "/chat/stream":
+                                                first = None
+                                                async with client.stream("POST", endpoint, json={"message": question}) as r:
+                                                        r.raise_for_status()
+                                                        async for line in r.aiter_lines():
+                                                                if first is None and '"token"' in line:
+                                                                        first = time.perf_counter() - started
+                                                if first is not None:
+                                                        ttfts.append(first)
+                                        else:
+                                                body = {"message": question}
+                                                if endpoint == "/debug/retrieve":
+                                                        body["k"] = 8
+                                                r = await client.post(endpoint, json=body)
+                                                r.raise_for_status()
+                                except httpx.HTTPError:
+                                        errors += 1
+                                        return
+                                latencies.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                await asyncio.gather(*(one(i) for i in range(total)))
+                wall = time.perf_counter() - started
+        return summarize(latencies, errors, wall, ttfts)
+
+def run_ingest(env: dict, seed: str) -> dict:
+        out = subprocess.run(
+                [sys.executable, os.path.join(BENCH_DIR, "ingest_job.py"), "--seed", seed],
+                env=env, capture_output=True, text=True, check=True,
+        )
+        return json.loads(out.stdout.strip().splitlines()[-1])
+
+def compare(current: dict, previous_path: str) -> None:
+        with open(previous_path) as f:
+                previous = json.load(f)
+        print(f"\n=== Compared with {previous_path} ===")
+        print(f"{'endpoint':<18}{'conc':>6}{'p95 before':>12}{'p95 now':>10}{'change':>9}")
+        for endpoint, rows in current["endpoints"].items():
+                before = {r["concurrency"]: r for r in previous.get("endpoints", {}).get(endpoint, [])}
+                for row in rows:
+                        old = before.get(row["concurrency"])
+                        if not old:
+                                continue
+                        delta = (row["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0.0
+                        print(f"{endpoint:<18}{row['concurrency']:>6}{old['p95_ms']:>12.1f}{row['p95_ms']:>10.1f}{delta:>+8.1f}%")
+        # Older results hold a single ingest run instead of a list per concurrency.
+        old_ingest = previous.get("ingest") or []
+        before = {r.get("concurrency"): r for r in (old_ingest if isinstance(old_ingest, list) else [old_ingest])}
+        for row in current["ingest"]:
+                old = before.get(row["concurrency"])
+                if old:
+                        print(f"ingest c={row['concurrency']:<3} total_s: {old['total_s']} -> {row['total_s']}")
+
+def main():
+        ap = argparse.ArgumentParser(description="Offline latency/throughput benchmark for the RAG backend.")
+        ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+        ap.add_argument("--requests", type=int, default=48, help="Requests per endpoint per concurrency level")
+        ap.add_argument("--endpoints", nargs="+", default=["/debug/retrieve", "/chat", "/chat/stream"])
+        ap.add_argument("--pages", type=int, default=200, help="Fixture pages to ingest")
+        ap.add_argument("--ingest-concurrency", type=int, nargs="+", default=[1, 4, 8],
+                        help="CRAWL_WORKERS and EMBED_WORKERS levels for the ingest runs")
+        ap.add_argument("--embed-latency-ms", type=float, default=15)
+        ap.add_argument("--ttft-ms", type=float, default=300)
+        ap.add_argument("--tokens-per-sec", type=float, default=40)
+        ap.add_argument("--tokens", type=int, default=60)
+        ap.add_argument("--answer-cache", action="store_true", help="Leave the answer cache on (off by default)")
+        ap.add_argument("--output", help="Result file (default bench/results/bench-<timestamp>.json)")
+        ap.add_argument("--compare", help="Earlier result file to compare p95 latency against")
+        ap.add_argument("--keep-workdir", action="store_true", help="Keep the temporary store, indexes and backend.log")
+        args = ap.parse_args()
+
+        workdir = tempfile.mkdtemp(prefix="rag-bench-")
+        ollama_port = free_port()
+        backend_port = free_port()
+        ollama_url = f"http://127.0.0.1:{ollama_port}"
+        backend_url = f"http://127.0.0.1:{backend_port}"
+
+        env = dict(os.environ)
+        env.update({
+                "OLLAMA_BASE_URL": ollama_url,
+                "HTTP_CACHE_DIR": "",
+                "CRAWL_RATE": "1000",
+                "CRAWL_BURST": "1000",
+                "ANSWER_CACHE_ENABLED": "1" if args.answer_cache else "0",
+                "EMBED_CACHE_SIZE": env.get("EMBED_CACHE_SIZE", "512"),
+        })
+
+        procs = []
+        backend_log = None
+        site = FixtureSite(pages=args.pages)
+        try:
+                procs.append(subprocess.Popen([
+                        sys.executable, os.path.join(BENCH_DIR, "fake_ollama.py"),
+                        "--port", str(ollama_port),
+                        "--embed-latency-ms", str(args.embed_latency_ms),
+                        "--ttft-ms", str(args.ttft_ms),
+                        "--tokens-per-sec", str(args.tokens_per_sec),
+                        "--tokens", str(args.tokens),
+                ], stdout=subprocess.DEVNULL))
+                wait_for(f"{ollama_url}/api/tags")
+                site_url = site.start()
+
+                # One fresh store per level; the backend then serves the last one.
+                ingest_stats = []
+                for c in args.ingest_concurrency:
+                        store = os.path.join(workdir, f"ingest-c{c}")
+                        env.update({
+                                "PERSIST_DIR": os.path.join(store, "chroma"),
+                                "BM25_DIR": os.path.join(store, "chroma_bm25"),
+                                "CRAWL_WORKERS": str(c),
+                                "EMBED_WORKERS": str(c),
+                        })
+                        print(f"[bench] ingesting {args.pages} fixture pages, c={c}...")
+                        row = {"concurrency": c, **run_ingest(env, f"{site_url}/api/en-us/home.html")}
+                        ingest_stats.append(row)
+                        print(f"[bench] ingest c={c:<3} {row['total_s']}s {row['pages_per_s']} pages/s "
+                              f"{row['chunks_per_s']} chunks/s rss={row['max_rss_mb']}MB")
+
+                backend_log = open(os.path.join(workdir, "backend.log"), "w")
+                backend = subprocess.Popen(
+                        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(backend_port), "--log-level", "warning"],
+                        cwd=BACKEND_DIR, env=env, stdout=backend_log, stderr=subprocess.STDOUT,
+                )
+                procs.append(backend)
+                boot_started = time.perf_counter()
+                wait_for(f"{backend_url}/healthz")
+                live_s = time.perf_counter() - boot_started
+                wait_for(f"{backend_url}/readyz", ok_status=200)
+                startup_mem = {"live_s": round(live_s, 3), "ready_s": round(time.perf_counter() - boot_started, 3), **rss_mb(backend.pid)}
+                print(f"[bench] backend live after {startup_mem['live_s']}s, ready after {startup_mem['ready_s']}s")
+
+                results: Dict[str, List[dict]] = {}
+                for endpoint in args.endpoints:
+                        # Warm-up pass so the first level doesn't pay for lazy imports.
+                        asyncio.run(drive(backend_url, endpoint, 1, 2))
+                        for c in args.concurrency:
+                                row = asyncio.run(drive(backend_url, endpoint, c, args.requests))
+                                row["concurrency"] = c
+                                row.update(rss_mb(backend.pid))
+                                results.setdefault(endpoint, []).append(row)
+                                print(f"[bench] {endpoint:<16} c={c:<3} p50={row['p50_ms']:.1f}ms p95={row['p95_ms']:.1f}ms "
+                                      f"p99={row['p99_ms']:.1f}ms {row['throughput_rps']} req/s rss={row['rss_mb']}MB errors={row['errors']}")
+        finally:
+                for p in reversed(procs):
+                        p.terminate()
+                        try:
+                                p.wait(timeout=10)
+                        except subprocess.TimeoutExpired:
+                                p.kill()
+                site.stop()
+                if backend_log is not None:
+                        backend_log.close()
+                if args.keep_workdir:
+                        print(f"[bench] workdir kept at {workdir}")
+                else:
+                        shutil.rmtree(workdir, ignore_errors=True)
+
+        report = {
+                "meta": {
+                        "timestamp": datetime.utcnow().isoformat(),
+                        "git_rev": git_rev(),
+                        "python": platform.python_version(),
+                        "platform": platform.platform(),
+                        "cpu_count": os.cpu_count(),
+                        "config": vars(args),
+                },
+                "ingest": ingest_stats,
+                "backend_startup": startup_mem,
+                "endpoints": results,
+        }
+        output = args.output or os.path.join(RESULTS_DIR, f"bench-{datetime.utcnow():%Y%m%d-%H%M%S}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as f:
+                json.dump(report, f, indent=2)
+        print(f"[bench] results written to {output}")
+
+        if args.compare:
+                compare(report, args.compare)
+
+if __name__ == "__main__":
+        main()
@@ -1,15 +1,29 @@
 # query.py
+import os
+import sys
+import json
+import time
 import argparse
+import itertools
+from urllib.parse import urldefrag
+
+import numpy as np
 from langchain_community.vectorstores import Chroma
 from langchain_ollama import OllamaEmbeddings
 
 # Must match your ingest settings
-PERSIST_DIR = "./chroma_fedex"
+PERSIST_DIR = os.getenv("PERSIST_DIR", "./vector_store/chroma_fedex")
 EMBED_MODEL = "nomic-embed-text"   # e.g., `ollama pull nomic-embed-text`
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/")
+
+_db = None
 
 def get_db():
-    embeddings = OllamaEmbeddings(model=EMBED_MODEL)
-    return Chroma(persist_directory=PERSIST_DIR, embedding_function=embeddings)
+    global _db
+    if _db is None:
+        embeddings = OllamaEmbeddings(model=EMBED_MODEL, base_url=OLLAMA_BASE_URL)
+        _db = Chroma(persist_directory=PERSIST_DIR, embedding_function=embeddings)
+    return _db
 
 def show(query: str, k: int = 4, use_mmr: bool = True, fetch_k: int = 20, lambda_mult: float = 0.5):
     """
@@ -27,14 +41,157 @@ def show(query: str, k: int = 4, use_mmr: bool = True, fetch_k: int = 20, lambda
         preview = (h.page_content or "")[:500].replace("\n", " ")
         print(f"\n[{i}] {src}\n{preview} ...")
 
+def normalize_url(u: str) -> str:
+    u, _ = urldefrag((u or "").strip())
+    return u.rstrip("/")
+
+def load_questions(path: str) -> list:
+    """
+    JSONL, one object per line: {"question": "...", "expected": ["url", ...]}.
+    `expected` may also be a single string; a trailing "*" matches any URL
+    with that prefix (e.g. ".../catalog/track/*").
+    """
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            row = json.loads(line)
+            expected = row.get("expected") or row.get("expected_urls") or []
+            if isinstance(expected, str):
+                expected = [expected]
+            if not row.get("question") or not expected:
+                raise ValueError(f"{path}:{n}: need 'question' and 'expected'")
+            items.append({"question": row["question"], "expected": [normalize_url(e) for e in expected]})
+    if not items:
+        raise ValueError(f"{path}: no questions found")
+    return items
+
+def is_relevant(source: str, expected: list) -> bool:
+    source = normalize_url(source)
+    for e in expected:
+        if e.endswith("*") and source.startswith(e[:-1]):
+            return True
+        if source == e:
+            return True
+    return False
+
+def embed_questions(questions: list, batch_size: int, expand: bool) -> tuple:
+    texts = questions
+    if expand:
+        # The backend's query expansion only; /chat also applies its relevance
+        # threshold, BM25 fusion and product routing, which this does not.
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "apps", "backend"))
+        from query_expansion import expand_query
+        texts = [expand_query(q) for q in questions]
+    embeddings = get_db()._embedding_function
+    started = time.perf_counter()
+    vectors = []
+    for i in range(0, len(texts), batch_size):
+        vectors.extend(embeddings.embed_documents(texts[i:i + batch_size]))
+    return vectors, time.perf_counter() - started
+
+def sweep_configs(args) -> list:
+    configs = []
+    for k in args.sweep_k:
+        if "off" in args.mmr:
+            configs.append({"k": k, "mmr": False, "fetch_k": None, "lambda_mult": None})
+        if "on" in args.mmr:
+            for fetch_k, lam in itertools.product(args.sweep_fetch_k, args.sweep_lambda):
+                if fetch_k >= k:
+                    configs.append({"k": k, "mmr": True, "fetch_k": fetch_k, "lambda_mult": lam})
+    return configs
+
+def evaluate(config: dict, items: list, vectors: list) -> dict:
+    db = get_db()
+    recalls, reciprocal_ranks, latencies = [], [], []
+    for item, vec in zip(items, vectors):
+        started = time.perf_counter()
+        if config["mmr"]:
+            hits = db.max_marginal_relevance_search_by_vector(
+                vec, k=config["k"], fetch_k=config["fetch_k"], lambda_mult=config["lambda_mult"]
+            )
+        else:
+            hits = db.similarity_search_by_vector(vec, k=config["k"])
+        latencies.append(time.perf_counter() - started)
+
+        sources = [h.metadata.get("source", "") for h in hits]
+        found = {e for e in item["expected"] for s in sources if is_relevant(s, [e])}
+        recalls.append(len(found) / len(item["expected"]))
+        rank = next((i for i, s in enumerate(sources, 1) if is_relevant(s, item["expected"])), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+    lat = np.array(latencies) * 1000
+    return {
+        **config,
+        "recall": round(float(np.mean(recalls)), 4),
+        "mrr": round(float(np.mean(reciprocal_ranks)), 4),
+        "p50_ms": round(float(np.percentile(lat, 50)), 2),
+        "p95_ms": round(float(np.percentile(lat, 95)), 2),
+        "p99_ms": round(float(np.percentile(lat, 99)), 2),
+    }
+
+def print_table(rows: list) -> None:
+    print(f"\n{'k':>4} {'mmr':>4} {'fetch_k':>8} {'lambda':>7} {'recall@k':>9} {'MRR':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for r in rows:
+        fetch_k = r["fetch_k"] if r["mmr"] else "-"
+        lam = r["lambda_mult"] if r["mmr"] else "-"
+        print(f"{r['k']:>4} {'on' if r['mmr'] else 'off':>4} {fetch_k:>8} {lam:>7} "
+              f"{r['recall']:>9.3f} {r['mrr']:>7.3f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+
+def run_eval(args) -> None:
+    try:
+        items = load_questions(args.eval)
+    except (OSError, ValueError) as e:
+        sys.exit(f"[eval] {e}")
+    print(f"[eval] {len(items)} questions, store {PERSIST_DIR}")
+    vectors, embed_s = embed_questions([i["question"] for i in items], args.batch_size, args.expand)
+    print(f"[eval] embedded in {embed_s:.2f}s ({embed_s * 1000 / len(items):.1f} ms/question, batch {args.batch_size})")
+
+    # One throwaway query so the first configuration doesn't pay for cold caches.
+    get_db().similarity_search_by_vector(vectors[0], k=1)
+    rows = [evaluate(c, items, vectors) for c in sweep_configs(args)]
+    rows.sort(key=lambda r: (-r["recall"], -r["mrr"], r["p95_ms"]))
+    print_table(rows)
+
+    report = {
+        "persist_dir": PERSIST_DIR,
+        "questions": len(items),
+        "expand": args.expand,
+        "embed_ms_per_question": round(embed_s * 1000 / len(items), 2),
+        "results": rows,
+    }
+    if args.output == "-":
+        print(json.dumps(report, indent=2))
+    elif args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n[eval] results written to {args.output}")
+
 def main():
     ap = argparse.ArgumentParser(description="Query Chroma with optional MMR (default ON).")
     ap.add_argument("-k", type=int, default=4, help="Number of results to return")
     ap.add_argument("--no-mmr", action="store_true", help="Disable Maximal Marginal Relevance")
     ap.add_argument("--fetch_k", type=int, default=20, help="Candidate pool size for MMR")
     ap.add_argument("--lambda_mult", type=float, default=0.5, help="MMR relevance/diversity balance (0..1)")
+
+    ev = ap.add_argument_group("batch evaluation (--eval)")
+    ev.add_argument("--eval", metavar="QUESTIONS.jsonl", help="Score retrieval on a question file instead of prompting")
+    ev.add_argument("--k-values", dest="sweep_k", type=int, nargs="+", default=[4, 8, 12], help="k values to sweep")
+    ev.add_argument("--fetch-k-values", dest="sweep_fetch_k", type=int, nargs="+", default=[16, 32], help="MMR fetch_k values to sweep")
+    ev.add_argument("--lambda-values", dest="sweep_lambda", type=float, nargs="+", default=[0.3, 0.5, 0.7], help="MMR lambda_mult values to sweep")
+    ev.add_argument("--mmr-modes", dest="mmr", nargs="+", choices=["on", "off"], default=["on", "off"])
+    ev.add_argument("--batch-size", type=int, default=64, help="Questions per embedding request")
+    ev.add_argument("--expand", action="store_true", help="Apply the backend's query expansion before embedding "
+                    "(not its relevance threshold, BM25 fusion or product routing)")
+    ev.add_argument("--output", help="Write results JSON here ('-' for stdout)")
     args = ap.parse_args()
 
+    if args.eval:
+        run_eval(args)
+        return
+
     while True:
         q = input("\nAsk a question (or 'quit'): ").strip()
         if q.lower() in {"quit", "exit", "q"}:
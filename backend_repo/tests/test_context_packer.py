@@ -0,0 +1,31 @@
+# test_context_packer.py
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "apps", "backend"))
+
+from langchain_core.documents import Document
+
+from context_packer import merge_passages, pack_context
+
+SOURCE = "https://developer.fedex.com/api/en-us/catalog/ship/v1/docs.html"
+
+def chunk(text: str, start: int) -> Document:
+        return Document(page_content=text, metadata={"source": SOURCE, "start_index": start})
+
+def test_merges_overlapping_chunks_by_offset():
+        page = "Ship API overview. " * 10 + "The createShipment request needs a shipper and recipients."
+        first, second = page[:120], page[100:]
+        merged = merge_passages([chunk(first, 0), chunk(second, 100)])
+        assert len(merged) == 1
+        assert merged[0].text == page
+
+def test_stale_start_index_does_not_drop_text():
+        # The first chunk was rewritten and re-embedded at offset 0; the second
+        # was skipped by incremental ingest and still carries its old offset.
+        rewritten = "Ship API overview, rewritten to be much longer than before. " * 3
+        unchanged = "createShipment fields: requestedShipment.shipper, requestedShipment.recipients, labelResponseOptions."
+        blocks, _ = pack_context([chunk(rewritten, 0), chunk(unchanged, 105)], 1000)
+        text = "\n".join(t for _, t in blocks)
+        assert "labelResponseOptions" in text
+        assert "requestedShipment.shipper" in text
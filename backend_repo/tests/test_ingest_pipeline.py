@@ -0,0 +1,95 @@
+# test_ingest_pipeline.py
+import os
+import sys
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "apps", "ingest"))
+
+import ingest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+SITE = "https://developer.example.com"
+SEED = f"{SITE}/api/en-us/home.html"
+
+def page(title: str, links=()) -> str:
+        body = " ".join(f"{title} explains request fields, response codes and examples." for _ in range(4))
+        anchors = "".join(f"<a href='{u}'>{u}</a>" for u in links)
+        return f"<html><body><h1>{title}</h1><p>{body}</p>{anchors}</body></html>"
+
+class FakeResponse:
+        def __init__(self, status_code: int, text: str = ""):
+                self.status_code = status_code
+                self.text = text
+                self.headers = {}
+
+        def raise_for_status(self):
+                if self.status_code >= 400:
+                        raise requests.HTTPError(f"{self.status_code} error", response=self)
+
+class FakeSite:
+        """URL -> (status, html); anything else raises like an unreachable host."""
+
+        def __init__(self, routes: dict):
+                self.routes = routes
+
+        def get(self, url, headers=None, timeout=None):
+                if url not in self.routes:
+                        raise requests.ConnectionError(f"cannot reach {url}")
+                status, text = self.routes[url]
+                return FakeResponse(status, text)
+
+def full_site(**overrides) -> dict:
+        routes = {
+                f"{SITE}/robots.txt": (200, "User-agent: *\nAllow: /"),
+                SEED: (200, page("Home", ["/api/en-us/ship.html", "/api/en-us/track.html", "/api/en-us/rate.html"])),
+                f"{SITE}/api/en-us/ship.html": (200, page("Ship API")),
+                f"{SITE}/api/en-us/track.html": (200, page("Track API")),
+                f"{SITE}/api/en-us/rate.html": (200, page("Rate API")),
+        }
+        routes.update(overrides)
+        return routes
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+        monkeypatch.setattr(ingest, "http_cache", None)
+        monkeypatch.setattr(ingest, "CLEAN_WORKERS", 0)
+        monkeypatch.setattr(ingest, "build_embeddings", lambda: DeterministicFakeEmbedding(size=16))
+        monkeypatch.setattr(ingest, "rate_limiter", ingest.HostRateLimiter(rate=1e6, burst=1000))
+        persist_dir = str(tmp_path / "chroma")
+
+        def run_with(routes: dict) -> dict:
+                monkeypatch.setattr(ingest, "robots", ingest.RobotsCache())
+                monkeypatch.setattr(ingest.session, "get", FakeSite(routes).get)
+                db = ingest.run_pipeline([SEED], persist_dir=persist_dir)
+                data = db.get(include=["documents", "metadatas"])
+                by_source: dict = {}
+                for text, meta in zip(data["documents"], data["metadatas"]):
+                        by_source.setdefault(meta["source"], []).append(text)
+                return by_source
+
+        return run_with
+
+def test_unreachable_host_keeps_every_chunk(run):
+        before = run(full_site())
+        assert len(before) == 4
+        after = run({})
+        assert after == before
+
+def test_only_gone_or_refetched_pages_lose_chunks(run):
+        run(full_site())
+        after = run(full_site(**{
+                f"{SITE}/api/en-us/ship.html": (200, page("Ship API v2")),
+                f"{SITE}/api/en-us/track.html": (404, ""),
+                f"{SITE}/api/en-us/rate.html": (503, ""),
+        }))
+        assert f"{SITE}/api/en-us/track.html" not in after
+        assert all("Ship API v2" in t for t in after[f"{SITE}/api/en-us/ship.html"])
+        # A server error is not proof the page is gone.
+        assert f"{SITE}/api/en-us/rate.html" in after
+
+def test_robots_outage_or_denial_keeps_chunks(run):
+        before = run(full_site())
+        assert run(full_site(**{f"{SITE}/robots.txt": (503, "")})) == before
+        assert run(full_site(**{f"{SITE}/robots.txt": (200, "User-agent: *\nDisallow: /")})) == before
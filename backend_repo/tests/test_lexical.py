@@ -0,0 +1,43 @@
+# test_lexical.py
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "apps", "backend"))
+sys.path.insert(0, os.path.join(HERE, "..", "apps", "ingest"))
+
+import ingest
+from lexical import LexicalIndex
+
+class FakeStore:
+        def __init__(self, texts):
+                self.texts = texts
+
+        def get(self, include=None):
+                return {
+                        "ids": [f"id{i}" for i in range(len(self.texts))],
+                        "documents": self.texts,
+                        "metadatas": [{"source": f"page{i}"} for i in range(len(self.texts))],
+                }
+
+def test_backend_builds_postings_from_published_chunks(tmp_path):
+        out = str(tmp_path / "bm25")
+        ingest.build_bm25_index(FakeStore([
+                "Request an OAuth token with clientCredentials.",
+                "Track a shipment by its trackingNumber.",
+        ]), out)
+        assert sorted(os.listdir(out)) == ["chunks.json", "meta.json"]
+
+        first = LexicalIndex(out)
+        second = LexicalIndex(out)
+        # The second load reuses the postings the first one wrote.
+        assert [p for p in os.listdir(out) if p.startswith("postings")] == [f"postings-{first.version}"]
+        assert second.version == first.version
+        assert [doc.metadata["source"] for doc, _ in second.search("tracking number")] == ["page1"]
+
+        ingest.build_bm25_index(FakeStore(["Rate quotes for a shipment."]), out)
+        latest = LexicalIndex(out)
+        assert latest.version != first.version
+        assert [doc.page_content for doc, _ in latest.search("rate")] == ["Rate quotes for a shipment."]
+        # An index loaded before the republish keeps serving from its mapped files.
+        assert [doc.metadata["source"] for doc, _ in first.search("oauth")] == ["page0"]
@@ -0,0 +1,17 @@
+# test_page_index.py
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "apps", "backend"))
+
+from page_index import chunk_page
+
+MENU = "\n".join(["Home", "APIs", "Tracking", "Ship API", "Rates and Transit"])
+
+def test_keeps_repeated_schema_lines_and_drops_repeated_menu():
+        fields = "\n".join(f"requestedShipment.field{i}\nRequired\ntype string\nExample: value{i}" for i in range(80))
+        page = f"{MENU}\nThe Ship API creates shipments and returns labels for each package.\n{fields}\n{MENU}"
+        text = "\n".join(chunk_page(page, 800))
+        assert text.count("Required") == 80
+        assert text.count("type string") == 80
+        assert text.count("Rates and Transit") == 1
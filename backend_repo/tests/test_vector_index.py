@@ -0,0 +1,23 @@
+# test_vector_index.py
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "apps", "backend"))
+
+from langchain_community.vectorstores import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from vector_index import VectorIndex
+
+def test_mmr_matches_chroma_order(tmp_path):
+        db = Chroma(persist_directory=str(tmp_path / "chroma"), embedding_function=DeterministicFakeEmbedding(size=16))
+        db.add_texts([f"chunk {i}" for i in range(12)], metadatas=[{"source": f"page{i}"} for i in range(12)])
+        index = VectorIndex(db, str(tmp_path / "vectors"))
+        rng = np.random.default_rng(0)
+        for _ in range(10):
+                q = rng.normal(size=16).tolist()
+                ours = [d.page_content for d in index.max_marginal_relevance_search(q, k=4, fetch_k=8)]
+                chroma = [d.page_content for d in db.max_marginal_relevance_search_by_vector(q, k=4, fetch_k=8)]
+                assert ours == chroma
@@ -57,7 +57,7 @@ echo "  - Installing scraper dependencies..."
 pip install -q beautifulsoup4 langchain-community langchain-text-splitters requests lxml chromadb langchain-ollama
 
 echo "  - Installing backend dependencies..."
-pip install -q fastapi uvicorn
+pip install -q fastapi uvicorn httpx
 
 echo "✅ Python dependencies installed"
 